@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+import os
 from pathlib import Path
 from decouple import config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,6 +74,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'user_api.middleware.ReadYourWritesMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Corsheader settings
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -105,16 +107,105 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE is 'sqlite' (default) or 'postgres'. DB_REPLICAS lists read
+# replicas: comma separated hosts for Postgres, database files for SQLite.
+# Catalog reads go to a replica, see user_api/routers.py.
+DB_ENGINE = config("DB_ENGINE", default='sqlite')
+# Seconds a connection is reused across requests, 0 closes it after each one
+DB_CONN_MAX_AGE = config("DB_CONN_MAX_AGE", default=0 if DB_ENGINE == 'sqlite' else 60, cast=int)
+DB_REPLICAS = config("DB_REPLICAS", default='', cast=lambda value: [item.strip() for item in value.split(',') if item.strip()])
+
+# 'concurrent' lets readers and writers work at the same time and queues
+# writers instead of failing them with "database is locked", 'default' is
+# SQLite as Django ships it. Compare them with manage.py benchmark_sqlite.
+SQLITE_PROFILE = config("SQLITE_PROFILE", default='concurrent')
+SQLITE_CONCURRENT_OPTIONS = {
+    # Seconds a writer waits for the lock before giving up
+    'timeout': config("SQLITE_BUSY_TIMEOUT", default=10, cast=int),
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        'PRAGMA journal_mode = WAL',
+        # Durable on checkpoint rather than on every commit, safe with WAL
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA mmap_size = %d' % config("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024, cast=int),
+        # Negative is KiB, not pages
+        'PRAGMA cache_size = -%d' % config("SQLITE_CACHE_KB", default=64 * 1024, cast=int),
+        'PRAGMA temp_store = MEMORY',
+    ]),
+}
+
+
+def database(**overrides):
+    if DB_ENGINE == 'postgres':
+        db = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config("DB_NAME", default='cinema'),
+            'USER': config("DB_USER", default='postgres'),
+            'PASSWORD': config("DB_PASSWORD", default=''),
+            'HOST': config("DB_HOST", default='localhost'),
+            'PORT': config("DB_PORT", default='5432'),
+        }
+    else:
+        db = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config("DB_NAME", default=str(BASE_DIR / 'db.sqlite3')),
+            # A file (not the shared in-memory default) so concurrency tests get real locking
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+        if SQLITE_PROFILE == 'concurrent':
+            db.update(ENGINE='user_api.backends.sqlite3', OPTIONS=dict(SQLITE_CONCURRENT_OPTIONS))
+    # Persistent connections are checked before reuse, so a restarted server costs one retry
+    db.update(CONN_MAX_AGE=DB_CONN_MAX_AGE, CONN_HEALTH_CHECKS=DB_CONN_MAX_AGE > 0)
+    db.update(overrides)
+    return db
+
+
+DATABASES = {'default': database()}
+for number, replica in enumerate(DB_REPLICAS, 1):
+    location = {'HOST': replica} if DB_ENGINE == 'postgres' else {'NAME': replica}
+    # Tests read the replicas through the primary's connection
+    DATABASES['replica%d' % number] = database(TEST={'MIRROR': 'default'}, **location)
+
+DATABASE_ROUTERS = ['user_api.routers.PrimaryReplicaRouter']
+# Seconds a client keeps reading from the primary after it wrote something,
+# should cover the replication lag
+DB_REPLICA_LAG = config("DB_REPLICA_LAG", default=5, cast=int)
+
+# Cache
+# Local memory is per process, point CACHE_BACKEND at a file or Redis cache
+# when running several workers so invalidations reach all of them.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config("CACHE_BACKEND", default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config("CACHE_LOCATION", default='user-api'),
     }
 }
 
+# Lifetime of cached catalog responses (cinemas, halls, movies, shows)
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=600, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
+# Password hashing profile: 'pbkdf2', 'scrypt' or 'argon2' (needs argon2-cffi).
+# Existing hashes of another profile or cost are upgraded on the next login.
+# `manage.py benchmark_hashers` measures what a cost means on this host.
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'user_api.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'user_api.hashers.ScryptPasswordHasher',
+    'argon2': 'user_api.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHER_PROFILE = config("PASSWORD_HASHER_PROFILE", default='pbkdf2')
+# Preferred hasher first, the others stay to verify older hashes
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    path for profile, path in PASSWORD_HASHER_PROFILES.items() if profile != PASSWORD_HASHER_PROFILE
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PASSWORD_PBKDF2_ITERATIONS = config("PASSWORD_PBKDF2_ITERATIONS", default=720000, cast=int)
+PASSWORD_SCRYPT_WORK_FACTOR = config("PASSWORD_SCRYPT_WORK_FACTOR", default=2 ** 14, cast=int)
+PASSWORD_ARGON2_TIME_COST = config("PASSWORD_ARGON2_TIME_COST", default=2, cast=int)
+PASSWORD_ARGON2_MEMORY_COST = config("PASSWORD_ARGON2_MEMORY_COST", default=102400, cast=int)
+PASSWORD_ARGON2_PARALLELISM = config("PASSWORD_ARGON2_PARALLELISM", default=8, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -136,11 +227,66 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'user_api.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'user_api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # Sliding windows for the credential endpoints, see user_api/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config("LOGIN_RATE_IP", default='20/min'),
+        'login_username': config("LOGIN_RATE_USERNAME", default='5/min'),
+        'register_ip': config("REGISTER_RATE_IP", default='10/hour'),
+    },
 }
 
+AUTHENTICATION_BACKENDS = ['user_api.authentication.PooledModelBackend']
+
+# Threads that run password hashing for login/ and register/, and how many
+# more requests may wait for one before they are answered with 503.
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=os.cpu_count() or 2, cast=int)
+PASSWORD_HASH_QUEUE = config("PASSWORD_HASH_QUEUE", default=32, cast=int)
+PASSWORD_HASH_TIMEOUT = config("PASSWORD_HASH_TIMEOUT", default=10.0, cast=float)
+
+# Signed tokens issued by login/. Access tokens are checked without any
+# database query, so keep them short-lived; revocations are shared through
+# the cache, which must be shared (e.g. Redis) across processes.
+JWT_SIGNING_KEY = config("JWT_SIGNING_KEY", default=SECRET_KEY)
+JWT_ALGORITHM = 'HS256'
+JWT_ACCESS_TTL = config("JWT_ACCESS_TTL", default=300, cast=int)
+JWT_REFRESH_TTL = config("JWT_REFRESH_TTL", default=7 * 24 * 3600, cast=int)
+# How long a deactivated or deleted user's access tokens may still be accepted
+JWT_USER_TTL = config("JWT_USER_TTL", default=60, cast=int)
+
+# Minutes a cinema hall needs between two shows for cleaning
+SHOW_CLEANING_BUFFER = config("SHOW_CLEANING_BUFFER", default=15, cast=int)
+
+# Seat holds between seat selection and checkout. Use
+# 'user_api.holds.CacheHoldStore' with a shared cache (e.g. Redis) when
+# running more than one process.
+SEAT_HOLD_STORE = config("SEAT_HOLD_STORE", default='user_api.holds.TimingWheelHoldStore')
+SEAT_HOLD_TTL = config("SEAT_HOLD_TTL", default=300, cast=int)
+SEAT_HOLD_MAX_TTL = config("SEAT_HOLD_MAX_TTL", default=900, cast=int)
+# Held seats are taken for everybody else: at most this many per user and show,
+# and extensions stop this many seconds after the hold was made
+SEAT_HOLD_MAX_SEATS = config("SEAT_HOLD_MAX_SEATS", default=10, cast=int)
+SEAT_HOLD_MAX_LIFETIME = config("SEAT_HOLD_MAX_LIFETIME", default=1800, cast=int)
+
+# Seat map streams (async/shows/<pk>/events/): comment line sent every
+# HEARTBEAT seconds to keep proxies from closing idle streams, and events a
+# client may fall behind before it is sent a fresh snapshot instead.
+SEAT_EVENTS_HEARTBEAT = config("SEAT_EVENTS_HEARTBEAT", default=15, cast=int)
+SEAT_EVENTS_MAX_PENDING = config("SEAT_EVENTS_MAX_PENDING", default=100, cast=int)
+
+# Batched log ingestion (logs/batch/): records wait in memory and are written
+# with one bulk INSERT per FLUSH_SIZE records or FLUSH_INTERVAL seconds.
+LOG_BUFFER_MAX_SIZE = config("LOG_BUFFER_MAX_SIZE", default=10000, cast=int)
+LOG_BUFFER_FLUSH_SIZE = config("LOG_BUFFER_FLUSH_SIZE", default=500, cast=int)
+LOG_BUFFER_FLUSH_INTERVAL = config("LOG_BUFFER_FLUSH_INTERVAL", default=1.0, cast=float)
+
+# Days of logs kept by `manage.py prune_logs`
+LOG_RETENTION_DAYS = config("LOG_RETENTION_DAYS", default=30, cast=int)
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
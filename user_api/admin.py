@@ -5,7 +5,13 @@ from . import models
 admin.site.register(models.Cinema)
 admin.site.register(models.CinemaHall)
 admin.site.register(models.CinemaSeat)
+admin.site.register(models.Genre)
+admin.site.register(models.Actor)
 admin.site.register(models.Movie)
 admin.site.register(models.Show)
+admin.site.register(models.ShowSeatMap)
 admin.site.register(models.Ticket)
+admin.site.register(models.ShowStats)
+admin.site.register(models.MovieDailyStats)
+admin.site.register(models.CinemaDailyStats)
 admin.site.register(models.Log)
\ No newline at end of file
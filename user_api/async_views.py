@@ -0,0 +1,163 @@
+"""
+Async-native versions of the hot catalog and booking endpoints.
+
+Under an ASGI server these run on the event loop and read through the async
+ORM, so a slow client or a waiting query holds a coroutine instead of a
+worker thread. Only the booking transaction still runs in a thread, the async
+ORM has no transactions. Authentication is by bearer token only.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import ValidationError
+
+from .booking import BookingContention, book_seats
+from .events import RESYNC, format_event, get_seat_event_hub
+from .filters import MovieSearchFilter, ShowSearchFilter, parse_limit
+from .holds import get_hold_store
+from .models import Movie, Show
+from .seatmap import SeatConflict, UnknownSeats, abuild_seat_map
+from .serializers import BookingSerializer, MovieSerializer, ShowSerializer, TicketSerializer
+from .tokens import ACCESS, TokenError, adecode, auser_from_claims
+
+MAX_LIMIT = 500
+
+
+def page_params(params):
+    limit = parse_limit(params, settings.REST_FRAMEWORK['PAGE_SIZE'], MAX_LIMIT)
+    try:
+        before = int(params['before']) if params.get('before') else None
+    except ValueError:
+        raise ValidationError({"before": "Expected an integer."})
+    return limit, before
+
+
+async def keyset_page(request, queryset, serializer_class, filter_backend):
+    """Newest first, ``?before=<pk>`` continues after the last row of the previous page."""
+    try:
+        filters = filter_backend().get_filters(request.GET)
+        limit, before = page_params(request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    queryset = queryset.filter(**filters).order_by('-pk')
+    if before is not None:
+        queryset = queryset.filter(pk__lt=before)
+    rows = [row async for row in queryset[:limit + 1]]
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['before'] = rows[-1].pk
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+    return JsonResponse({"next": next_url, "results": serializer_class(rows, many=True).data})
+
+
+async def bearer_user(request):
+    header = request.headers.get('Authorization', '').split()
+    if len(header) != 2 or header[0].lower() != 'bearer':
+        return None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=401,
+                                  headers={"WWW-Authenticate": 'Bearer realm="api"'})
+    try:
+        claims = await adecode(header[1], ACCESS)
+        user = await auser_from_claims(claims)
+    except TokenError as exc:
+        return None, JsonResponse({"detail": str(exc)}, status=401,
+                                  headers={"WWW-Authenticate": 'Bearer realm="api"'})
+    return user, None
+
+
+@require_GET
+async def movie_list(request):
+    return await keyset_page(request, Movie.objects.all(), MovieSerializer, MovieSearchFilter)
+
+
+@require_GET
+async def movie_detail(request, pk):
+    movie = await Movie.objects.filter(pk=pk).afirst()
+    if movie is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(MovieSerializer(movie).data)
+
+
+@require_GET
+async def show_list(request):
+    return await keyset_page(request, Show.objects.all(), ShowSerializer, ShowSearchFilter)
+
+
+@require_GET
+async def show_seat_map(request, pk):
+    show = await Show.objects.filter(pk=pk).afirst()
+    if show is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(await abuild_seat_map(show))
+
+
+async def seat_event_stream(hub, subscription, show):
+    try:
+        yield format_event('snapshot', await abuild_seat_map(show))
+        while True:
+            try:
+                message = await subscription.get(settings.SEAT_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Also the chance to notice holds that ran out while nobody touched the store
+                get_hold_store().expire()
+                yield b': heartbeat\n\n'
+                continue
+            if message is RESYNC:
+                yield format_event('snapshot', await abuild_seat_map(show))
+            else:
+                yield message
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@require_GET
+async def show_events(request, pk):
+    """
+    Server-sent events for one show: a ``snapshot`` with the full seat map,
+    then a ``seats`` event with the seat ids that became booked, held or
+    available whenever that happens.
+    """
+    show = await Show.objects.filter(pk=pk).afirst()
+    if show is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    hub = get_seat_event_hub()
+    # Subscribe before reading the snapshot so no change falls in between
+    subscription = hub.subscribe(show.pk)
+    response = StreamingHttpResponse(seat_event_stream(hub, subscription, show), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def show_booking(request, pk):
+    user, error = await bearer_user(request)
+    if error:
+        return error
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"detail": "Expected a JSON body."}, status=400)
+    serializer = BookingSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    show = await Show.objects.filter(pk=pk).afirst()
+    if show is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    try:
+        ticket = await sync_to_async(book_seats)(show, user, serializer.validated_data['seats'],
+                                                 serializer.validated_data.get('hold'))
+    except UnknownSeats as exc:
+        return JsonResponse({"unknown_seats": exc.seats}, status=400)
+    except SeatConflict as exc:
+        return JsonResponse({"conflicts": exc.seats}, status=409)
+    except BookingContention as exc:
+        return JsonResponse({"detail": str(exc)}, status=503, headers={"Retry-After": "1"})
+    return JsonResponse(TicketSerializer(ticket).data, status=201)
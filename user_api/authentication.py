@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .passwords import hash_password, verify_password
+from .tokens import ACCESS, TokenError, decode, user_from_claims
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend with the user lookup on the calling thread and the password
+    check on the hasher pool. Raises HasherBusy when the pool is saturated.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hash_password(password)
+            return None
+        if verify_password(password, user.password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    ``Authorization: Bearer <access token>``. The signature, the cached
+    revocation list and the cached user state are all that is checked, no
+    password hashing and no session or user query per request.
+    """
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Authorization header.')
+        try:
+            claims = decode(auth[1].decode(), ACCESS)
+            user = user_from_claims(claims)
+        except (TokenError, UnicodeError) as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+        return user, claims
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
@@ -0,0 +1,40 @@
+"""
+SQLite backend with the ``init_command`` and ``transaction_mode`` options of
+Django 5.1, so PRAGMAs run on every new connection and write transactions can
+start with ``BEGIN IMMEDIATE``. Drop it for the stock engine after upgrading.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = {'DEFERRED', 'EXCLUSIVE', 'IMMEDIATE'}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_mode = None
+    init_commands = ()
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured('settings.DATABASES[%r]["OPTIONS"]["transaction_mode"] is %r, expected one of %s.'
+                                       % (self.alias, transaction_mode, ', '.join(sorted(TRANSACTION_MODES))))
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        self.init_commands = [command.strip() for command in kwargs.pop('init_command', '').split(';')
+                              if command.strip()]
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # IMMEDIATE takes the write lock up front. A deferred transaction that
+        # reads first and then writes can't wait for a concurrent writer, SQLite
+        # fails it with "database is locked" right away instead.
+        if self.transaction_mode is None:
+            self.cursor().execute('BEGIN')
+        else:
+            self.cursor().execute('BEGIN %s' % self.transaction_mode)
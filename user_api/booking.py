@@ -0,0 +1,109 @@
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import F
+
+from .models import CinemaSeat, ShowSeatMap, Ticket
+from .events import publish_seats
+from .holds import HoldNotFound, get_hold_store, held_by_others
+from .seatmap import SeatBitmap, SeatConflict, resolve_seats
+
+MAX_ATTEMPTS = 20
+
+
+class BookingContention(Exception):
+    pass
+
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+
+
+def _swap(show, seat_map, bitmap):
+    """Compare-and-swap the bitmap, only succeeds if nobody wrote it since we read it."""
+    return ShowSeatMap.objects.filter(pk=show.pk, version=seat_map.version).update(
+        booked=bitmap.to_bytes(), version=F('version') + 1)
+
+
+def book_seats(show, user, seat_ids, hold_id=None):
+    """
+    Reserve all of ``seat_ids`` for ``show`` and create the Ticket in one transaction.
+
+    Only the show's ShowSeatMap row is written, so buyers of different shows never
+    wait on each other. Concurrent buyers of the same show race on the map version
+    and the losers retry against the fresh bitmap. Seats on hold for somebody
+    else count as taken, the buyer's own hold is released once the ticket exists.
+    """
+    seat_ids = list(dict.fromkeys(seat_ids))
+    indexes = resolve_seats(show, seat_ids)
+    held = held_by_others(show, seat_ids, str(user.pk))
+    if held:
+        raise SeatConflict(held)
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                seat_map, _ = ShowSeatMap.objects.get_or_create(show=show)
+                booked = SeatBitmap(seat_map.booked)
+                lost = [seat_id for seat_id in seat_ids if indexes[seat_id] in booked]
+                if lost:
+                    raise SeatConflict(lost)
+                for seat_id in seat_ids:
+                    booked.add(indexes[seat_id])
+                if _swap(show, seat_map, booked):
+                    ticket = Ticket.objects.create(
+                        show=show,
+                        user=user,
+                        price=show.show_price * len(seat_ids),
+                        seats=','.join(seat_ids),
+                    )
+                    transaction.on_commit(lambda: publish_seats(show.pk, booked=seat_ids))
+                    if hold_id:
+                        transaction.on_commit(lambda: release_hold(hold_id, str(user.pk), seat_ids))
+                    return ticket
+        except OperationalError:
+            # SQLite reports a busy database instead of blocking, treat it as a lost race
+            pass
+        _backoff(attempt)
+    raise BookingContention('Too many concurrent bookings for this show, please retry.')
+
+
+def release_hold(hold_id, owner, booked):
+    try:
+        hold = get_hold_store().release(hold_id, owner)
+    except HoldNotFound:
+        return
+    # The held seats that were not bought are free again
+    publish_seats(hold.show_id, available=[seat_id for seat_id in hold.seats if seat_id not in booked])
+
+
+def release_seats(show, seat_ids):
+    seat_ids = [seat_id for seat_id in seat_ids if seat_id]
+    if not seat_ids:
+        return
+    indexes = dict(CinemaSeat.objects.using('default').filter(cinema_hall_id=show.cinema_hall_id, pk__in=seat_ids)
+                   .values_list('cinema_seat_id', 'seat_index'))
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                seat_map = ShowSeatMap.objects.filter(show=show).first()
+                if seat_map is None:
+                    return
+                booked = SeatBitmap(seat_map.booked)
+                for index in indexes.values():
+                    booked.discard(index)
+                if _swap(show, seat_map, booked):
+                    transaction.on_commit(lambda: publish_seats(show.pk, available=list(indexes)))
+                    return
+        except OperationalError:
+            pass
+        _backoff(attempt)
+    raise BookingContention('Too many concurrent bookings for this show, please retry.')
+
+
+def cancel_ticket(ticket):
+    with transaction.atomic():
+        release_seats(ticket.show, ticket.seats.split(','))
+        ticket.delete()
@@ -0,0 +1,35 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'catalog-gen:%s'
+
+
+def _key(model):
+    return GENERATION_KEY % model._meta.label_lower
+
+
+def bump_generation(model):
+    """Invalidate every cached response that depends on ``model``."""
+    cache.set(_key(model), time.time_ns(), None)
+
+
+def get_generations(models):
+    keys = [_key(model) for model in models]
+    generations = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in generations}
+    if missing:
+        # Nothing is known about these models yet, start them from "now"
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def response_key(request, generations):
+    fingerprint = '|'.join([
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        ','.join(str(generation) for generation in generations),
+    ])
+    return 'catalog-response:%s' % hashlib.md5(fingerprint.encode()).hexdigest()
@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+RESYNC = object()
+
+
+def format_event(name, data, event_id=None):
+    lines = ['id: %s' % event_id] if event_id is not None else []
+    lines += ['event: %s' % name, 'data: %s' % json.dumps(data, separators=(',', ':'))]
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class Subscription:
+    """One stream's queue of encoded events, filled from any thread."""
+
+    def __init__(self, show_id, loop, max_pending):
+        self.show_id = show_id
+        self.loop = loop
+        self.queue = asyncio.Queue(max_pending)
+
+    def push(self, message):
+        # Runs on the subscriber's loop. A client too slow to keep up gets a
+        # fresh snapshot instead of an ever growing backlog.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class SeatEventHub:
+    """
+    In-process fan-out of seat changes to the streams watching a show.
+
+    An event is encoded once and the same bytes are handed to every subscriber,
+    so one booking costs one JSON dump whether ten or ten thousand clients
+    watch. Each process has its own hub and sees the changes made by itself.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tasks = set()
+
+    def subscribe(self, show_id):
+        subscription = Subscription(show_id, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(show_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.show_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.show_id, None)
+
+    def subscriber_count(self, show_id):
+        with self._lock:
+            return len(self._subscribers.get(show_id, ()))
+
+    def publish(self, show_id, **changes):
+        """Send ``booked``, ``held`` and ``available`` seat id lists to the show's streams."""
+        changes = {state: list(seat_ids) for state, seat_ids in changes.items() if seat_ids}
+        with self._lock:
+            subscribers = list(self._subscribers.get(show_id, ()))
+        if not changes or not subscribers:
+            return
+        message = format_event('seats', {'show': show_id, **changes}, next(self._ids))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # The stream's event loop is gone
+                self.unsubscribe(subscription)
+
+    def hold_expired(self, hold):
+        if not self.subscriber_count(hold.show_id):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.publish_expired(hold)
+        else:
+            # Noticed on an event loop, the seat map is read off it
+            task = loop.create_task(sync_to_async(self.publish_expired)(hold))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def publish_expired(self, hold):
+        """Free the seats of a hold that ran out, except those booked without passing the hold."""
+        from .seatmap import booked_among
+
+        booked = booked_among(hold.show_id, hold.seats)
+        self.publish(hold.show_id, available=[seat_id for seat_id in hold.seats if seat_id not in booked])
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_seat_event_hub():
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            from .holds import get_hold_store
+
+            _hub = SeatEventHub(max_pending=settings.SEAT_EVENTS_MAX_PENDING)
+            get_hold_store().listeners.append(_hub.hold_expired)
+    return _hub
+
+
+def publish_seats(show_id, **changes):
+    if _hub is not None:
+        _hub.publish(show_id, **changes)
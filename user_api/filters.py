@@ -0,0 +1,178 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Log
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_bool(name, value):
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValidationError({name: 'Expected true or false.'})
+
+
+def parse_limit(params, default, maximum):
+    """``?limit=`` clamped to 1..maximum, so it never turns into a negative slice or SQL LIMIT."""
+    try:
+        limit = int(params.get('limit', default))
+    except ValueError:
+        raise ValidationError({'limit': 'Expected an integer.'})
+    return max(1, min(limit, maximum))
+
+
+def parse_moment(name, value, end=False):
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        # A bare date covers the whole day
+        moment = datetime.combine(day, time.max if end else time.min)
+    if moment is None:
+        raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class QueryParamFilter(BaseFilterBackend):
+    """
+    Filter on exact query parameters, ``lookups`` maps a parameter to the ORM
+    lookup it filters on. Only exact and range lookups are offered so every
+    filter can be answered from an index.
+    """
+    lookups = {}
+    boolean_lookups = {}
+    range_lookups = {}
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request.query_params)
+        return queryset.filter(**filters) if filters else queryset
+
+    def get_filters(self, params):
+        filters = {}
+        for name, lookup in self.lookups.items():
+            if params.get(name):
+                filters[lookup] = params[name]
+        for name, lookup in self.boolean_lookups.items():
+            if params.get(name):
+                filters[lookup] = parse_bool(name, params[name])
+        for name, (lookup, end) in self.range_lookups.items():
+            if params.get(name):
+                filters[lookup] = parse_moment(name, params[name], end)
+        return filters
+
+
+class ShowSearchFilter(QueryParamFilter):
+    lookups = {
+        'city': 'cinema_hall__cinema__city',
+        'district': 'cinema_hall__cinema__district',
+        'cinema': 'cinema_hall__cinema_id',
+        'cinema_hall': 'cinema_hall_id',
+        'movie': 'movie_id',
+        'language': 'movie__language',
+        'genre': 'movie__genres__name',
+        'actor': 'movie__cast__name',
+    }
+    boolean_lookups = {
+        'in_theatre': 'movie__in_theatre',
+    }
+    range_lookups = {
+        'date_from': ('date__gte', False),
+        'date_to': ('date__lte', True),
+    }
+
+
+class LogRangeFilter(QueryParamFilter):
+    """Time window filters also bound the day bucket so only those days are read."""
+    lookups = {
+        'level': 'level',
+    }
+    range_lookups = {
+        'since': ('timestamp__gte', False),
+        'until': ('timestamp__lte', True),
+    }
+
+    def get_filters(self, params):
+        filters = super().get_filters(params)
+        if 'timestamp__gte' in filters:
+            filters['bucket__gte'] = Log.bucket_for(filters['timestamp__gte'])
+        if 'timestamp__lte' in filters:
+            filters['bucket__lte'] = Log.bucket_for(filters['timestamp__lte'])
+        return filters
+
+
+class MovieSearchFilter(QueryParamFilter):
+    lookups = {
+        'language': 'language',
+        'genre': 'genres__name',
+        'actor': 'cast__name',
+    }
+    boolean_lookups = {
+        'in_theatre': 'in_theatre',
+    }
+    range_lookups = {
+        'released_from': ('release_date__gte', False),
+        'released_to': ('release_date__lte', True),
+    }
+
+
+class TicketFilter(QueryParamFilter):
+    lookups = {
+        'user': 'user_id',
+        'show': 'show_id',
+    }
+    range_lookups = {
+        'purchased_from': ('purchase_time__gte', False),
+        'purchased_to': ('purchase_time__lte', True),
+    }
+
+
+class ShowStatsFilter(QueryParamFilter):
+    lookups = {
+        'movie': 'show__movie_id',
+        'cinema_hall': 'show__cinema_hall_id',
+        'cinema': 'show__cinema_hall__cinema_id',
+    }
+    range_lookups = {
+        'date_from': ('show__date__gte', False),
+        'date_to': ('show__date__lte', True),
+    }
+
+
+class DailyStatsFilter(QueryParamFilter):
+    """``day_from`` and ``day_to`` are plain (UTC) dates, matching the stored days."""
+
+    def get_filters(self, params):
+        filters = super().get_filters(params)
+        for name, lookup in (('day_from', 'day__gte'), ('day_to', 'day__lte')):
+            if params.get(name):
+                try:
+                    day = parse_date(params[name])
+                except ValueError:
+                    day = None
+                if day is None:
+                    raise ValidationError({name: 'Expected an ISO 8601 date.'})
+                filters[lookup] = day
+        return filters
+
+
+class MovieDailyStatsFilter(DailyStatsFilter):
+    lookups = {
+        'movie': 'movie_id',
+    }
+
+
+class CinemaDailyStatsFilter(DailyStatsFilter):
+    lookups = {
+        'cinema': 'cinema_id',
+    }
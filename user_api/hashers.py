@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS rounds."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt with N = PASSWORD_SCRYPT_WORK_FACTOR, memory grows with N."""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def maxmem(self):
+        # 128 * N * r bytes plus headroom, OpenSSL refuses anything above 32 MiB by default
+        return 256 * self.work_factor * self.block_size
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """argon2id from the optional argon2-cffi package."""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+# Setting of the cost knob each algorithm scales with, roughly linearly
+COST_SETTINGS = {
+    'pbkdf2_sha256': 'PASSWORD_PBKDF2_ITERATIONS',
+    'scrypt': 'PASSWORD_SCRYPT_WORK_FACTOR',
+    'argon2': 'PASSWORD_ARGON2_TIME_COST',
+}
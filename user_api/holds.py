@@ -0,0 +1,321 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .events import publish_seats
+from .seatmap import SeatConflict, get_booked, resolve_seats
+
+
+class HoldNotFound(Exception):
+    pass
+
+
+class HoldLimitExceeded(Exception):
+    pass
+
+
+@dataclass
+class Hold:
+    show_id: int
+    seats: tuple
+    owner: str
+    expires_at: float
+    hold_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # Extensions never go past this, see SEAT_HOLD_MAX_LIFETIME
+    deadline: float = float('inf')
+
+    @classmethod
+    def start(cls, show_id, seat_ids, owner, now, ttl):
+        deadline = now + settings.SEAT_HOLD_MAX_LIFETIME
+        return cls(show_id, tuple(seat_ids), owner, min(now + ttl, deadline), deadline=deadline)
+
+    @property
+    def expires(self):
+        return datetime.fromtimestamp(self.expires_at, tz=timezone.utc)
+
+
+class TimingWheelHoldStore:
+    """
+    In-process hold store.
+
+    Holds are hashed into a ring of one-second slots by expiry time, so advancing
+    the clock only visits the slots that elapsed instead of every live hold. Holds
+    longer than one rotation simply stay in their slot until a later pass.
+    """
+
+    def __init__(self, slots=3600, tick=1.0, clock=time.time):
+        self._clock = clock
+        self._tick = tick
+        self._slots = [set() for _ in range(slots)]
+        self._cursor = self._tick_of(clock())
+        self._holds = {}
+        self._seats = {}
+        self._owned = {}
+        self._lock = threading.Lock()
+        self.listeners = []
+
+    def _tick_of(self, timestamp):
+        return int(timestamp // self._tick)
+
+    def _slot(self, hold):
+        return self._slots[self._tick_of(hold.expires_at) % len(self._slots)]
+
+    def _advance(self, now):
+        target = self._tick_of(now)
+        first = max(self._cursor, target - len(self._slots) + 1)
+        expired = []
+        for tick in range(first, target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for hold_id in [hold_id for hold_id in slot if self._holds[hold_id].expires_at <= now]:
+                expired.append(self._drop(hold_id))
+        self._cursor = target
+        return expired
+
+    def _drop(self, hold_id):
+        hold = self._holds.pop(hold_id)
+        self._slot(hold).discard(hold_id)
+        owned = self._owned.get((hold.show_id, hold.owner), set())
+        owned.discard(hold_id)
+        if not owned:
+            self._owned.pop((hold.show_id, hold.owner), None)
+        for seat_id in hold.seats:
+            if self._seats.get((hold.show_id, seat_id)) == hold_id:
+                del self._seats[(hold.show_id, seat_id)]
+        return hold
+
+    def _live(self, hold_id, owner=None):
+        hold = self._holds.get(hold_id)
+        if hold is None or (owner is not None and hold.owner != owner):
+            raise HoldNotFound(hold_id)
+        return hold
+
+    def _notify(self, expired):
+        for hold in expired:
+            for listener in self.listeners:
+                listener(hold)
+
+    def hold(self, show_id, seat_ids, owner, ttl):
+        now = self._clock()
+        with self._lock:
+            expired = self._advance(now)
+            taken = [seat_id for seat_id in seat_ids
+                     if (show_id, seat_id) in self._seats
+                     and self._holds[self._seats[(show_id, seat_id)]].owner != owner]
+            if not taken:
+                hold = Hold.start(show_id, seat_ids, owner, now, ttl)
+                for seat_id in seat_ids:
+                    previous = self._seats.get((show_id, seat_id))
+                    if previous:
+                        self._release_seat(previous, seat_id)
+                    self._seats[(show_id, seat_id)] = hold.hold_id
+                self._holds[hold.hold_id] = hold
+                self._slot(hold).add(hold.hold_id)
+                self._owned.setdefault((show_id, owner), set()).add(hold.hold_id)
+        self._notify(expired)
+        if taken:
+            raise SeatConflict(taken)
+        return hold
+
+    def _release_seat(self, hold_id, seat_id):
+        hold = self._holds[hold_id]
+        hold.seats = tuple(seat for seat in hold.seats if seat != seat_id)
+        if not hold.seats:
+            self._drop(hold_id)
+
+    def get(self, hold_id, owner=None):
+        now = self._clock()
+        with self._lock:
+            expired = self._advance(now)
+            hold = self._holds.get(hold_id)
+        self._notify(expired)
+        if hold is None or (owner is not None and hold.owner != owner):
+            raise HoldNotFound(hold_id)
+        return hold
+
+    def extend(self, hold_id, owner, ttl):
+        now = self._clock()
+        with self._lock:
+            expired = self._advance(now)
+            try:
+                hold = self._live(hold_id, owner)
+            except HoldNotFound:
+                hold = None
+            else:
+                self._slot(hold).discard(hold_id)
+                hold.expires_at = min(now + ttl, hold.deadline)
+                self._slot(hold).add(hold_id)
+        self._notify(expired)
+        if hold is None:
+            raise HoldNotFound(hold_id)
+        return hold
+
+    def release(self, hold_id, owner=None):
+        with self._lock:
+            hold = self._live(hold_id, owner)
+            self._drop(hold_id)
+        return hold
+
+    def expire(self):
+        """Drop the holds that ran out and tell the listeners, without waiting for the next call."""
+        with self._lock:
+            expired = self._advance(self._clock())
+        self._notify(expired)
+
+    def held_by(self, show_id, owner):
+        """The seats ``owner`` holds for the show."""
+        now = self._clock()
+        with self._lock:
+            expired = self._advance(now)
+            seats = {seat_id for hold_id in self._owned.get((show_id, owner), ())
+                     for seat_id in self._holds[hold_id].seats}
+        self._notify(expired)
+        return seats
+
+    def holders(self, show_id, seat_ids):
+        """Return ``{seat_id: owner}`` for the seats of ``seat_ids`` currently on hold."""
+        now = self._clock()
+        with self._lock:
+            expired = self._advance(now)
+            result = {}
+            for seat_id in seat_ids:
+                hold_id = self._seats.get((show_id, seat_id))
+                if hold_id is not None:
+                    result[seat_id] = self._holds[hold_id].owner
+        self._notify(expired)
+        return result
+
+
+class CacheHoldStore:
+    """
+    Hold store on top of a Django cache, e.g. Redis for multi-process deployments.
+
+    Every hold and every held seat is a key with the hold's TTL, so the cache
+    server expires them and nothing has to sweep. Seats are claimed with ``add``
+    (SETNX) and rolled back if any seat of the request is already taken.
+    """
+
+    def __init__(self, alias='default', clock=time.time):
+        self._alias = alias
+        self._clock = clock
+        self.listeners = []
+
+    @property
+    def cache(self):
+        return caches[self._alias]
+
+    @staticmethod
+    def _hold_key(hold_id):
+        return 'seat-hold:%s' % hold_id
+
+    @staticmethod
+    def _seat_key(show_id, seat_id):
+        return 'seat-hold:%s:%s' % (show_id, seat_id)
+
+    @staticmethod
+    def _owner_key(show_id, owner):
+        return 'seat-hold-owner:%s:%s' % (show_id, owner)
+
+    def _live_holds(self, show_id, owner):
+        hold_ids = self.cache.get(self._owner_key(show_id, owner), [])
+        return list(self.cache.get_many([self._hold_key(hold_id) for hold_id in hold_ids]).values())
+
+    def hold(self, show_id, seat_ids, owner, ttl):
+        now = self._clock()
+        hold = Hold.start(show_id, seat_ids, owner, now, ttl)
+        ttl = hold.expires_at - now
+        claimed, taken = [], []
+        for seat_id in seat_ids:
+            key = self._seat_key(show_id, seat_id)
+            if self.cache.add(key, (hold.hold_id, owner), ttl):
+                claimed.append(key)
+            else:
+                current = self.cache.get(key)
+                if current is not None and current[1] == owner:
+                    self.cache.set(key, (hold.hold_id, owner), ttl)
+                else:
+                    taken.append(seat_id)
+        if taken:
+            self.cache.delete_many(claimed)
+            raise SeatConflict(taken)
+        self.cache.set(self._hold_key(hold.hold_id), hold, ttl)
+        # Not atomic, only requests of the same owner race on it
+        live = [other.hold_id for other in self._live_holds(show_id, owner)]
+        self.cache.set(self._owner_key(show_id, owner), live + [hold.hold_id], settings.SEAT_HOLD_MAX_LIFETIME)
+        return hold
+
+    def get(self, hold_id, owner=None):
+        hold = self.cache.get(self._hold_key(hold_id))
+        if hold is None or (owner is not None and hold.owner != owner):
+            raise HoldNotFound(hold_id)
+        return hold
+
+    def extend(self, hold_id, owner, ttl):
+        hold = self.get(hold_id, owner)
+        now = self._clock()
+        hold.expires_at = min(now + ttl, hold.deadline)
+        ttl = hold.expires_at - now
+        self.cache.set(self._hold_key(hold_id), hold, ttl)
+        for seat_id in hold.seats:
+            self.cache.touch(self._seat_key(hold.show_id, seat_id), ttl)
+        return hold
+
+    def release(self, hold_id, owner=None):
+        hold = self.get(hold_id, owner)
+        keys = [self._seat_key(hold.show_id, seat_id) for seat_id in hold.seats]
+        owned = [key for key, value in self.cache.get_many(keys).items() if value[0] == hold_id]
+        self.cache.delete_many(owned + [self._hold_key(hold_id)])
+        # Seats taken over by a later hold of the owner stay held
+        hold.seats = tuple(seat_id for seat_id, key in zip(hold.seats, keys) if key in owned)
+        return hold
+
+    def expire(self):
+        # The cache server expires keys on its own and tells nobody
+        pass
+
+    def held_by(self, show_id, owner):
+        holds = self._live_holds(show_id, owner)
+        keys = {(hold.hold_id, seat_id): self._seat_key(show_id, seat_id) for hold in holds for seat_id in hold.seats}
+        claims = self.cache.get_many(list(keys.values()))
+        return {seat_id for (hold_id, seat_id), key in keys.items() if claims.get(key, (None,))[0] == hold_id}
+
+    def holders(self, show_id, seat_ids):
+        keys = {self._seat_key(show_id, seat_id): seat_id for seat_id in seat_ids}
+        return {keys[key]: value[1] for key, value in self.cache.get_many(list(keys)).items()}
+
+
+_store = None
+
+
+def get_hold_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.SEAT_HOLD_STORE)()
+    return _store
+
+
+def held_by_others(show, seat_ids, owner):
+    return [seat_id for seat_id, holder in get_hold_store().holders(show.pk, seat_ids).items()
+            if holder != owner]
+
+
+def hold_seats(show, owner, seat_ids, ttl=None):
+    seat_ids = list(dict.fromkeys(seat_ids))
+    # Held seats count as taken for everybody else, so one account can't sit on a show.
+    # Concurrent requests of the same owner may each pass the check.
+    held = get_hold_store().held_by(show.pk, owner)
+    if len(held.union(seat_ids)) > settings.SEAT_HOLD_MAX_SEATS:
+        raise HoldLimitExceeded(settings.SEAT_HOLD_MAX_SEATS)
+    indexes = resolve_seats(show, seat_ids)
+    booked = get_booked(show)
+    lost = [seat_id for seat_id in seat_ids if indexes[seat_id] in booked]
+    if lost:
+        raise SeatConflict(lost)
+    hold = get_hold_store().hold(show.pk, seat_ids, owner, ttl or settings.SEAT_HOLD_TTL)
+    publish_seats(show.pk, held=hold.seats)
+    return hold
@@ -0,0 +1,97 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import Log
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    pass
+
+
+class LogBuffer:
+    """
+    In-process queue of Log rows written with ``bulk_create``.
+
+    A background thread flushes whenever ``flush_size`` records are waiting or
+    ``flush_interval`` seconds have passed, so requests only pay for an append.
+    Once ``max_size`` records are waiting new submissions are refused, callers
+    should back off instead of growing the queue without bound.
+    """
+
+    def __init__(self, max_size=10000, flush_size=500, flush_interval=1.0, autostart=True):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.autostart = autostart
+        self._records = deque()
+        self._ready = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def submit(self, records):
+        now = timezone.now()
+        rows = [Log(timestamp=now, **record) for record in records]
+        with self._ready:
+            if len(self._records) + len(rows) > self.max_size:
+                raise BufferFull('Log buffer is full, retry later.')
+            self._records.extend(rows)
+            if len(self._records) >= self.flush_size:
+                self._ready.notify()
+        if self.autostart:
+            self._start()
+        return len(rows)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._ready:
+                batch = list(self._records)
+                self._records.clear()
+            if batch:
+                Log.objects.bulk_create(batch)
+            return len(batch)
+
+    def _start(self):
+        if self._thread is None:
+            with self._ready:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='log-buffer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                if len(self._records) < self.flush_size:
+                    self._ready.wait(self.flush_interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                # Keep the flusher alive, the rows of the failed batch are lost
+                logger.exception('Could not write buffered log records')
+                connection.close()
+
+
+_buffer = None
+
+
+def get_log_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = LogBuffer(
+            max_size=settings.LOG_BUFFER_MAX_SIZE,
+            flush_size=settings.LOG_BUFFER_FLUSH_SIZE,
+            flush_interval=settings.LOG_BUFFER_FLUSH_INTERVAL,
+        )
+    return _buffer
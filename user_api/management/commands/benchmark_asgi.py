@@ -0,0 +1,120 @@
+import asyncio
+import io
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test.utils import override_settings
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Compare throughput and latency of the WSGI and ASGI handlers in-process, '
+            'with clients that take a while to send their request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per run (default: 500).')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Clients in flight at once (default: 200).')
+        parser.add_argument('--workers', type=int, default=16,
+                            help='Threads of the simulated WSGI server (default: 16).')
+        parser.add_argument('--client-delay', type=float, default=50,
+                            help='Milliseconds each client takes to send its request (default: 50).')
+        parser.add_argument('--wsgi-path', default='/accounts/movies/', help='Path requested through WSGI.')
+        parser.add_argument('--asgi-path', default='/accounts/async/movies/', help='Path requested through ASGI.')
+        parser.add_argument('--catalog-cache', action='store_true',
+                            help='Keep the response cache of the DRF catalog views on. Off by default, '
+                                 'the async views have none and would be compared with cache hits.')
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['workers']) < 1:
+            raise CommandError('--requests, --concurrency and --workers must be positive.')
+        timeout = settings.CATALOG_CACHE_TIMEOUT if options['catalog_cache'] else 0
+        with override_settings(CATALOG_CACHE_TIMEOUT=timeout):
+            self.report('wsgi', options['wsgi_path'], self.run_wsgi(options))
+            self.report('asgi', options['asgi_path'], asyncio.run(self.run_asgi(options)))
+
+    def report(self, name, path, result):
+        elapsed, latencies, statuses = result
+        self.stdout.write('%s %s: %.0f req/s  p50 %.1f ms  p99 %.1f ms  statuses %s' % (
+            name, path, len(latencies) / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99),
+            dict(statuses)))
+
+    def run_wsgi(self, options):
+        """
+        A threaded WSGI server: a worker is tied up from the moment it accepts a
+        connection, including the time the client needs to send the request.
+        Clients beyond ``--workers`` queue for a thread.
+        """
+        application = get_wsgi_application()
+        delay = options['client_delay'] / 1000
+        statuses = Counter()
+
+        def request(submitted):
+            time.sleep(delay)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': options['wsgi_path'], 'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            response = application(environ, lambda status, headers: statuses.update([status.split()[0]]))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            latencies = []
+            for offset in range(0, options['requests'], options['concurrency']):
+                batch = range(min(options['concurrency'], options['requests'] - offset))
+                submitted = time.perf_counter()
+                latencies.extend(pool.map(lambda _: request(submitted), batch))
+            pool.submit(connections.close_all).result()
+        return time.perf_counter() - started, [latency * 1000 for latency in latencies], statuses
+
+    async def run_asgi(self, options):
+        """The same clients against the ASGI handler, their wait is a sleeping coroutine."""
+        application = get_asgi_application()
+        delay = options['client_delay'] / 1000
+        statuses = Counter()
+
+        async def request():
+            submitted = time.perf_counter()
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': options['asgi_path'], 'raw_path': options['asgi_path'].encode(),
+                'query_string': b'', 'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+            }
+            sent = False
+
+            async def receive():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    await asyncio.sleep(delay)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses[str(message['status'])] += 1
+
+            await application(scope, receive, send)
+            return (time.perf_counter() - submitted) * 1000
+
+        started = time.perf_counter()
+        latencies = []
+        for offset in range(0, options['requests'], options['concurrency']):
+            batch = min(options['concurrency'], options['requests'] - offset)
+            latencies.extend(await asyncio.gather(*(request() for _ in range(batch))))
+        return time.perf_counter() - started, latencies, statuses
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from user_api.hashers import COST_SETTINGS
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Measure password hashing speed of the configured hasher profiles on this host.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(settings.PASSWORD_HASHER_PROFILES),
+                            help='Profile to measure, repeatable (default: all).')
+        parser.add_argument('--rounds', type=int, default=20, help='Hashes per measurement (default: 20).')
+        parser.add_argument('--threads', type=int, default=settings.PASSWORD_HASH_WORKERS,
+                            help='Concurrent hashes for the throughput run (default: PASSWORD_HASH_WORKERS).')
+        parser.add_argument('--budget', type=float,
+                            help='p99 latency budget in ms, prints the cost that fits it.')
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1 or options['threads'] < 1:
+            raise CommandError('--rounds and --threads must be positive.')
+        for profile in options['profile'] or sorted(settings.PASSWORD_HASHER_PROFILES):
+            hasher = import_string(settings.PASSWORD_HASHER_PROFILES[profile])()
+            try:
+                hasher.encode('benchmark', hasher.salt())
+            except ValueError as exc:
+                self.stdout.write('%-7s skipped: %s' % (profile, exc))
+                continue
+            self.measure(profile, hasher, options)
+
+    def measure(self, profile, hasher, options):
+        rounds = options['rounds']
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            hasher.encode('benchmark', hasher.salt())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(lambda _: hasher.encode('benchmark', hasher.salt()), range(rounds * options['threads'])))
+        throughput = rounds * options['threads'] / (time.perf_counter() - started)
+
+        cost_setting = COST_SETTINGS[hasher.algorithm]
+        cost = getattr(settings, cost_setting)
+        p50, p99 = percentile(timings, 0.5), percentile(timings, 0.99)
+        self.stdout.write('%-7s %s=%d  p50 %.1f ms  p99 %.1f ms  %.1f hashes/s single, %.1f hashes/s on %d threads'
+                          % (profile, cost_setting, cost, p50, p99, 1000 / p50, throughput, options['threads']))
+        if options['budget']:
+            # Hashing time grows about linearly with each profile's cost knob
+            fitting = int(cost * options['budget'] / p99)
+            if hasher.algorithm == 'scrypt':
+                fitting = 1 << (fitting.bit_length() - 1) if fitting > 1 else 2
+            self.stdout.write('%-7s %s=%d fits a p99 of %.0f ms'
+                              % (profile, cost_setting, max(fitting, 1), options['budget']))
@@ -0,0 +1,82 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+PROFILES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'concurrent': {'ENGINE': 'user_api.backends.sqlite3', 'OPTIONS': settings.SQLITE_CONCURRENT_OPTIONS},
+}
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent read-then-write transactions, like a booking, against a scratch SQLite '
+            'database with each profile and report commits per second and lock errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                            help='Profile to measure, repeatable (default: all).')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent writers (default: 16).')
+        parser.add_argument('--transactions', type=int, default=50,
+                            help='Transactions per writer (default: 50).')
+        parser.add_argument('--rows', type=int, default=4,
+                            help='Rows the writers update, fewer means more contention (default: 4).')
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['transactions'], options['rows']) < 1:
+            raise CommandError('--threads, --transactions and --rows must be positive.')
+        for profile in options['profile'] or sorted(PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                commits, errors, elapsed = self.run_profile(profile, Path(directory) / 'bench.sqlite3', options)
+            self.stdout.write('%-10s %5d commits  %.0f commits/s  %d lock errors' % (
+                profile, commits, commits / elapsed, errors))
+
+    def run_profile(self, profile, path, options):
+        alias = 'benchmark_%s' % profile
+        connections.settings[alias] = {
+            **connections['default'].settings_dict, **PROFILES[profile],
+            'NAME': str(path), 'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': False,
+        }
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)')
+                cursor.executemany('INSERT INTO counter VALUES (%s, 0)', [(row,) for row in range(options['rows'])])
+            connections[alias].close()
+            return self.run_writers(alias, options)
+        finally:
+            del connections.settings[alias]
+
+    def run_writers(self, alias, options):
+        commits = errors = 0
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def writer(number):
+            nonlocal commits, errors
+            start.wait()
+            for i in range(options['transactions']):
+                row = (number + i) % options['rows']
+                try:
+                    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT value FROM counter WHERE id = %s', [row])
+                        value = cursor.fetchone()[0]
+                        cursor.execute('UPDATE counter SET value = %s WHERE id = %s', [value + 1, row])
+                except OperationalError:
+                    with lock:
+                        errors += 1
+                else:
+                    with lock:
+                        commits += 1
+            connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return commits, errors, time.perf_counter() - started
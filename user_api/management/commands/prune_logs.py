@@ -0,0 +1,44 @@
+import gzip
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from user_api.models import Log
+from user_api.renderers import ndjson_line
+from user_api.serializers import LogSerializer
+
+
+class Command(BaseCommand):
+    help = 'Delete log days older than the retention period, optionally archiving them first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.LOG_RETENTION_DAYS,
+                            help='Number of days to keep (default: LOG_RETENTION_DAYS).')
+        parser.add_argument('--archive-dir',
+                            help='Write every dropped day to <dir>/logs-YYYY-MM-DD.ndjson.gz first.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the days that would be dropped.')
+
+    def handle(self, *args, **options):
+        cutoff = Log.bucket_for(timezone.now()) - timedelta(days=options['days'])
+        buckets = (Log.objects.filter(bucket__lt=cutoff)
+                   .order_by('bucket').values_list('bucket', flat=True).distinct())
+
+        for bucket in buckets:
+            if options['dry_run']:
+                self.stdout.write('Would drop %s' % bucket)
+                continue
+            if options['archive_dir']:
+                self.archive(bucket, Path(options['archive_dir']))
+            deleted, _ = Log.objects.filter(bucket=bucket).delete()
+            self.stdout.write('Dropped %s (%d rows)' % (bucket, deleted))
+
+    def archive(self, bucket, directory):
+        directory.mkdir(parents=True, exist_ok=True)
+        serializer = LogSerializer()
+        path = directory / ('logs-%s.ndjson.gz' % bucket)
+        with gzip.open(path, 'wt', encoding='utf-8') as archive:
+            for row in Log.objects.filter(bucket=bucket).order_by('pk').iterator(chunk_size=5000):
+                archive.write(ndjson_line(serializer.to_representation(row)))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user_api.stats import rebuild_sales_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the show, movie and cinema sales totals from the tickets.'
+
+    def handle(self, *args, **options):
+        read = rebuild_sales_stats()
+        self.stdout.write('Rebuilt sales totals from %d tickets' % read)
@@ -0,0 +1,49 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .routers import pin_to_primary, unpin
+
+PIN_COOKIE = 'db_primary'
+
+
+class ReadYourWritesMiddleware:
+    """
+    A successful write sets a short-lived cookie; requests carrying it, and
+    every unsafe request, read from the primary. So a user who just bought a
+    ticket never sees a replica that has not caught up yet.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = pin_to_primary(self.wants_primary(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            unpin(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = pin_to_primary(self.wants_primary(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            unpin(token)
+        return self.process_response(request, response)
+
+    @staticmethod
+    def wants_primary(request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+
+    @staticmethod
+    def process_response(request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.DB_REPLICA_LAG, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,115 @@
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copies of the helpers this migration was written against, so later
+# changes to user_api.seatmap can't change what it does.
+class SeatBitmap:
+    def __init__(self, data=b''):
+        self._bits = bytearray(data)
+
+    def __iter__(self):
+        for byte_no, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield (byte_no << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def add(self, index):
+        byte = index >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (index & 7)
+
+    def to_bytes(self):
+        return bytes(self._bits.rstrip(b'\x00'))
+
+
+def parse_booked_shows(value):
+    return {int(token) for token in re.findall(r'\d+', value or '')}
+
+
+def natural_key(value):
+    """Numbers by value ("2" before "10"), letters spreadsheet style ("Z" before "AA")."""
+    return tuple((0, int(part), '') if part.isdigit() else (1, len(part), part.upper())
+                 for part in re.findall(r'\d+|\D+', value or ''))
+
+
+def booked_shows_to_seat_maps(apps, schema_editor):
+    CinemaSeat = apps.get_model('user_api', 'CinemaSeat')
+    Show = apps.get_model('user_api', 'Show')
+    ShowSeatMap = apps.get_model('user_api', 'ShowSeatMap')
+
+    bitmaps = {}
+    hall_counters = {}
+    seats = sorted(CinemaSeat.objects.iterator(), key=lambda seat: (
+        seat.cinema_hall_id, natural_key(seat.row_no), natural_key(seat.col_no), seat.cinema_seat_id))
+    for seat in seats:
+        seat.seat_index = hall_counters.get(seat.cinema_hall_id, 0)
+        hall_counters[seat.cinema_hall_id] = seat.seat_index + 1
+        seat.save(update_fields=['seat_index'])
+        for show_id in parse_booked_shows(seat.booked_shows):
+            bitmaps.setdefault(show_id, SeatBitmap()).add(seat.seat_index)
+
+    existing = set(Show.objects.filter(pk__in=bitmaps).values_list('pk', flat=True))
+    ShowSeatMap.objects.bulk_create(
+        ShowSeatMap(show_id=show_id, booked=bitmap.to_bytes())
+        for show_id, bitmap in bitmaps.items() if show_id in existing
+    )
+
+
+def seat_maps_to_booked_shows(apps, schema_editor):
+    CinemaSeat = apps.get_model('user_api', 'CinemaSeat')
+    ShowSeatMap = apps.get_model('user_api', 'ShowSeatMap')
+
+    booked = {}
+    for seat_map in ShowSeatMap.objects.select_related('show').iterator():
+        for index in SeatBitmap(seat_map.booked):
+            booked.setdefault((seat_map.show.cinema_hall_id, index), []).append(str(seat_map.show_id))
+    for seat in CinemaSeat.objects.iterator():
+        show_ids = booked.get((seat.cinema_hall_id, seat.seat_index))
+        if show_ids:
+            seat.booked_shows = ','.join(show_ids)
+            seat.save(update_fields=['booked_shows'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0009_movie_current_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cinemaseat',
+            name='seat_index',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ShowSeatMap',
+            fields=[
+                ('show', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_map', serialize=False, to='user_api.show')),
+                ('booked', models.BinaryField(default=b'')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'show_seat_map',
+            },
+        ),
+        migrations.RunPython(booked_shows_to_seat_maps, seat_maps_to_booked_shows),
+        migrations.AlterField(
+            model_name='cinemaseat',
+            name='seat_index',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cinemaseat',
+            unique_together={('cinema_hall', 'seat_index')},
+        ),
+        migrations.RemoveField(
+            model_name='cinemaseat',
+            name='booked_shows',
+        ),
+    ]
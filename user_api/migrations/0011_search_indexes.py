@@ -0,0 +1,41 @@
+# Generated by Django 5.0.4 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0010_cinemaseat_seat_index_showseatmap'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cinema',
+            index=models.Index(fields=['city', 'district'], name='cinema_city_district_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['language', 'in_theatre'], name='movie_language_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_date'], name='movie_release_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(condition=models.Q(('in_theatre', True)), fields=['release_date'], name='movie_showing_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='show',
+            index=models.Index(fields=['date'], name='show_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='show',
+            index=models.Index(fields=['movie', 'date'], name='show_movie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='show',
+            index=models.Index(fields=['cinema_hall', 'date'], name='show_hall_date_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.4 on 2026-10-18 06:45
+
+import re
+
+from django.db import migrations, models
+
+
+def split_names(value):
+    # Frozen copy of user_api.models.split_names
+    names = (name.strip() for name in re.split(r'[,|]', value or ''))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def split_genres_and_actors(apps, schema_editor):
+    Movie = apps.get_model('user_api', 'Movie')
+    Genre = apps.get_model('user_api', 'Genre')
+    Actor = apps.get_model('user_api', 'Actor')
+
+    movies = list(Movie.objects.values_list('movie_id', 'genre', 'actors'))
+    for model, through, column in ((Genre, Movie.genres.through, 1), (Actor, Movie.cast.through, 2)):
+        names = {movie[0]: [name[:100] for name in split_names(movie[column])] for movie in movies}
+        model.objects.bulk_create(
+            [model(name=name) for name in {name for row in names.values() for name in row}],
+            ignore_conflicts=True,
+        )
+        ids = dict(model.objects.values_list('name', 'pk'))
+        related = through._meta.get_field(model._meta.model_name).attname
+        through.objects.bulk_create(
+            [through(movie_id=movie_id, **{related: ids[name]}) for movie_id, row in names.items() for name in row],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0011_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Actor',
+            fields=[
+                ('actor_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'db_table': 'actor',
+            },
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('genre_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'db_table': 'genre',
+            },
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='cast',
+            field=models.ManyToManyField(blank=True, db_table='movie_actor', related_name='movies', to='user_api.actor'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(blank=True, db_table='movie_genre', related_name='movies', to='user_api.genre'),
+        ),
+        migrations.RunPython(split_genres_and_actors, migrations.RunPython.noop),
+    ]
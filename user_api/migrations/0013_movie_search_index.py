@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Frozen copies of the statements, user_api.search must keep POSTGRES_DOCUMENT
+# in step with the indexed expression
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(actors, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(director, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(about, '')), 'D')"
+)
+
+STATEMENTS = {
+    'sqlite': (
+        [
+            "CREATE VIRTUAL TABLE movie_fts USING fts5("
+            "title, actors, director, about, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+            "INSERT INTO movie_fts (rowid, title, actors, director, about) "
+            "SELECT movie_id, title, actors, director, about FROM movie",
+        ],
+        ["DROP TABLE IF EXISTS movie_fts"],
+    ),
+    'postgresql': (
+        ["CREATE INDEX movie_search_idx ON movie USING GIN ((%s))" % POSTGRES_DOCUMENT],
+        ["DROP INDEX IF EXISTS movie_search_idx"],
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[0]:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[1]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0012_genre_actor'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 06:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0014_row_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
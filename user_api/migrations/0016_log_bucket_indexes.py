@@ -0,0 +1,44 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+import user_api.models
+
+
+def fill_buckets(apps, schema_editor):
+    Log = apps.get_model('user_api', 'Log')
+    Log.objects.update(bucket=TruncDate('timestamp', tzinfo=datetime.timezone.utc))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0015_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='bucket',
+            field=user_api.models.DayBucketField(null=True, source='timestamp'),
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='log',
+            name='bucket',
+            field=user_api.models.DayBucketField(source='timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['bucket', 'level'], name='log_bucket_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['level', 'timestamp'], name='log_level_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['timestamp'], name='log_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.0.4 on 2026-10-18 06:54
+
+from datetime import timezone
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Frozen copy of user_api.stats.rebuild_sales_stats as of this migration
+def build_sales_stats(apps, schema_editor):
+    Ticket = apps.get_model('user_api', 'Ticket')
+    CinemaSeat = apps.get_model('user_api', 'CinemaSeat')
+    ShowStats = apps.get_model('user_api', 'ShowStats')
+    MovieDailyStats = apps.get_model('user_api', 'MovieDailyStats')
+    CinemaDailyStats = apps.get_model('user_api', 'CinemaDailyStats')
+
+    def totals():
+        return {'tickets_sold': 0, 'seats_sold': 0, 'revenue': Decimal('0')}
+
+    shows, movies, cinemas, halls = {}, {}, {}, {}
+    tickets = Ticket.objects.values_list('show_id', 'show__cinema_hall_id', 'show__movie_id',
+                                         'show__cinema_hall__cinema_id', 'purchase_time', 'price', 'seats')
+    for show_id, hall_id, movie_id, cinema_id, purchase_time, price, seats in tickets.iterator(chunk_size=5000):
+        day = purchase_time.astimezone(timezone.utc).date()
+        halls[show_id] = hall_id
+        for row in (shows.setdefault(show_id, totals()), movies.setdefault((movie_id, day), totals()),
+                    cinemas.setdefault((cinema_id, day), totals())):
+            row['tickets_sold'] += 1
+            row['seats_sold'] += sum(1 for seat_id in (seats or '').split(',') if seat_id)
+            row['revenue'] += price
+
+    capacity = dict(CinemaSeat.objects.filter(cinema_hall_id__in=set(halls.values()))
+                    .values('cinema_hall_id').annotate(seats=Count('pk'))
+                    .values_list('cinema_hall_id', 'seats'))
+    ShowStats.objects.bulk_create(
+        ShowStats(show_id=show_id, capacity=capacity.get(halls[show_id], 0), **row)
+        for show_id, row in shows.items())
+    MovieDailyStats.objects.bulk_create(
+        MovieDailyStats(movie_id=movie_id, day=day, **row) for (movie_id, day), row in movies.items())
+    CinemaDailyStats.objects.bulk_create(
+        CinemaDailyStats(cinema_id=cinema_id, day=day, **row) for (cinema_id, day), row in cinemas.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0016_log_bucket_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShowStats',
+            fields=[
+                ('tickets_sold', models.IntegerField(default=0)),
+                ('seats_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('show', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='user_api.show')),
+                ('capacity', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'show_stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='CinemaDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.IntegerField(default=0)),
+                ('seats_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('day', models.DateField()),
+                ('cinema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='user_api.cinema')),
+            ],
+            options={
+                'db_table': 'cinema_daily_stats',
+                'indexes': [models.Index(fields=['day'], name='cinema_daily_stats_day_idx')],
+                'unique_together': {('cinema', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.IntegerField(default=0)),
+                ('seats_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('day', models.DateField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='user_api.movie')),
+            ],
+            options={
+                'db_table': 'movie_daily_stats',
+                'indexes': [models.Index(fields=['day'], name='movie_daily_stats_day_idx')],
+                'unique_together': {('movie', 'day')},
+            },
+        ),
+        migrations.RunPython(build_sales_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive uniqueness for usernames and emails, so find_taken() can
+    probe both in one indexed query and concurrent signups are settled by the
+    database. Blank emails are left out, Django allows any number of them.
+    Fails if auth_user already holds duplicates that differ only in case.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('user_api', '0018_revoked_token'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX auth_user_username_lower_uniq ON auth_user (LOWER(username))',
+            'DROP INDEX auth_user_username_lower_uniq',
+        ),
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_lower_uniq ON auth_user (LOWER(email)) WHERE email > ''",
+            'DROP INDEX auth_user_email_lower_uniq',
+        ),
+    ]
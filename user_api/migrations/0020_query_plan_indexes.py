@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-18 07:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0019_user_lower_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cinemadailystats',
+            name='cinema',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_api.cinema'),
+        ),
+        migrations.AlterField(
+            model_name='cinemaseat',
+            name='cinema_hall',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_api.cinemahall'),
+        ),
+        migrations.AlterField(
+            model_name='moviedailystats',
+            name='movie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_api.movie'),
+        ),
+        migrations.AlterField(
+            model_name='show',
+            name='cinema_hall',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_api.cinemahall'),
+        ),
+        migrations.AlterField(
+            model_name='show',
+            name='movie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_api.movie'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', 'purchase_time'], name='ticket_user_purchase_idx'),
+        ),
+    ]
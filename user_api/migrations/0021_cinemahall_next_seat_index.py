@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def fill_next_seat_index(apps, schema_editor):
+    CinemaHall = apps.get_model('user_api', 'CinemaHall')
+    CinemaSeat = apps.get_model('user_api', 'CinemaSeat')
+
+    last = CinemaSeat.objects.values('cinema_hall_id').annotate(last=Max('seat_index'))
+    for row in last:
+        CinemaHall.objects.filter(pk=row['cinema_hall_id']).update(next_seat_index=row['last'] + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_api', '0020_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cinemahall',
+            name='next_seat_index',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_next_seat_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,317 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .cache import bump_generation, get_generations, response_key
+from .routers import primary
+from .renderers import NDJSONRenderer, ndjson_line
+
+
+class NDJSONExportMixin:
+    """
+    Stream the whole (filtered) list as NDJSON for ``?format=ndjson`` or
+    ``Accept: application/x-ndjson``.
+
+    Rows are read with a chunked ``iterator()`` and serialized one at a time, so
+    memory stays flat no matter how big the table is. Pagination does not apply,
+    so exports are for back-office jobs and need ``export_permission_classes``.
+    """
+    export_chunk_size = 2000
+    export_permission_classes = (permissions.IsAdminUser,)
+
+    def get_renderers(self):
+        return super().get_renderers() + [NDJSONRenderer()]
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != NDJSONRenderer.format:
+            return super().list(request, *args, **kwargs)
+        for permission in self.export_permission_classes:
+            if not permission().has_permission(request, self):
+                self.permission_denied(request, message=getattr(permission, 'message', None))
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        serializer = self.get_serializer()
+        rows = (ndjson_line(serializer.to_representation(row))
+                for row in queryset.iterator(chunk_size=self.export_chunk_size))
+        return StreamingHttpResponse(rows, content_type=NDJSONRenderer.media_type)
+
+
+class ExpandMixin:
+    """
+    ``?expand=movie,cinema_hall.cinema`` support for views whose serializer
+    uses ExpandableFieldsMixin. Every expanded path is joined with
+    ``select_related`` so a page costs one query however many rows it has.
+    """
+
+    def get_expand(self):
+        if self.request.method != 'GET':
+            return []
+        allowed = self.get_serializer_class().expandable_paths()
+        requested = self.request.query_params.get('expand', '')
+        return [path for path in requested.split(',') if path in allowed]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        related = [path.replace('.', '__') for path in self.get_expand()]
+        return queryset.select_related(*related) if related else queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for GET responses of catalog views.
+
+    Entries are keyed on the URL, the Accept header and the generation of every
+    model in ``cache_dependencies``. Saving or deleting one of those models bumps
+    its generation (see signals.py), so stale entries are never read again and
+    simply age out. Responses carry an ETag and Last-Modified and conditional
+    requests are answered with 304 straight from the cache.
+    """
+    cache_dependencies = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        generations = get_generations(self.cache_dependencies)
+        key = response_key(request, generations)
+        entry = cache.get(key)
+        if entry is None:
+            # Filled from the primary: a lagging replica's rows would be cached
+            # under the new generation for the whole timeout
+            with primary():
+                response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            response.render()
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': response.get('ETag') or '"%s"' % hashlib.md5(response.content).hexdigest(),
+                'last_modified': max(generations) // 10 ** 9,
+            }
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        if self.not_modified(request, entry):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    @staticmethod
+    def not_modified(request, entry):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return if_none_match.strip() == '*' or entry['etag'] in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and entry['last_modified'] <= if_modified_since
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was modified since you fetched it.'
+    default_code = 'precondition_failed'
+
+
+class ConditionalMixin:
+    """
+    Strong ETags from the row version for detail views.
+
+    GET with a matching If-None-Match is answered with 304 before the object is
+    serialized. PUT, PATCH and DELETE lock the row and honour If-Match, so an
+    edit based on a stale copy fails with 412 instead of overwriting.
+    """
+    unsafe_methods = ('PUT', 'PATCH', 'DELETE')
+
+    def get_etag(self, instance):
+        parts = [instance._meta.model_name, instance.pk, instance.version]
+        expand = self.get_expand() if hasattr(self, 'get_expand') else []
+        # Every row along the path is serialized, not just the leaf
+        versions = {}
+        for path in expand:
+            related, prefix = instance, ()
+            for name in path.split('.'):
+                related, prefix = getattr(related, name), prefix + (name,)
+                versions[prefix] = related.version
+        parts.extend(version for _, version in sorted(versions.items()))
+        return '"%s"' % '-'.join(str(part) for part in parts)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in self.unsafe_methods:
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def get_object(self):
+        instance = super().get_object()
+        if_match = self.request.META.get('HTTP_IF_MATCH')
+        if self.request.method in self.unsafe_methods and if_match:
+            tags = parse_etags(if_match)
+            if '*' not in tags and self.get_etag(instance) not in tags:
+                raise PreconditionFailed()
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(instance)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+            if '*' in tags or etag in tags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers={'ETag': etag})
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.get_etag(self.updated_instance)
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_instance = serializer.instance
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+
+class BulkMixin:
+    """
+    Create (POST), update (PATCH) or delete (DELETE) many rows in one request.
+
+    POST and PATCH take a list of objects, PATCH items must carry the primary
+    key. DELETE takes ``{"ids": [...]}``. Every item is validated first and any
+    error fails the whole request with one error entry per item, in order.
+    Valid requests are written with bulk_create/bulk_update in one transaction.
+    """
+    max_items = 5000
+
+    def get_items(self, request):
+        if not isinstance(request.data, list) or not request.data:
+            return None, Response({"detail": "Expected a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_items:
+            return None, Response({"detail": "At most %d items per request." % self.max_items},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        return request.data, None
+
+    def prepare_bulk_create(self, instances):
+        """Hook to fill in what Model.save() would have set."""
+
+    def validate_bulk(self, instances):
+        """Hook for checks across the whole batch, returns a list of per-item errors or None."""
+
+    def written(self):
+        transaction.on_commit(lambda: bump_generation(self.get_queryset().model))
+
+    def post(self, request, *args, **kwargs):
+        items, error = self.get_items(request)
+        if error:
+            return error
+        serializers = [self.get_serializer(data=item) for item in items]
+        errors = [{} if serializer.is_valid() else serializer.errors for serializer in serializers]
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        errors = self.duplicate_keys(model, serializers)
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        instances = [model(**serializer.validated_data) for serializer in serializers]
+        errors = self.validate_bulk(instances)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                self.prepare_bulk_create(instances)
+                model.objects.bulk_create(instances)
+                self.written()
+        except IntegrityError:
+            # Validation passed, so somebody else wrote a conflicting row meanwhile
+            return Response({"detail": "Conflicts with rows written concurrently, please retry."},
+                            status=status.HTTP_409_CONFLICT)
+        for serializer, instance in zip(serializers, instances):
+            serializer.instance = instance
+        return Response([serializer.data for serializer in serializers], status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def duplicate_keys(model, serializers):
+        """Per-item errors for primary keys given more than once in the batch."""
+        pk_name = model._meta.pk.name
+        first, errors = {}, []
+        for index, serializer in enumerate(serializers):
+            pk = serializer.validated_data.get(pk_name)
+            if pk is not None and pk in first:
+                errors.append({pk_name: ['Same as item %d.' % first[pk]]})
+            else:
+                first.setdefault(pk, index)
+                errors.append({})
+        return errors
+
+    def patch(self, request, *args, **kwargs):
+        items, error = self.get_items(request)
+        if error:
+            return error
+        model = self.get_queryset().model
+        pk_name = model._meta.pk.name
+        with transaction.atomic():
+            existing = self.get_queryset().select_for_update().in_bulk(
+                [item.get(pk_name) for item in items if isinstance(item, dict)])
+            serializers, errors = [], []
+            for item in items:
+                instance = existing.get(item.get(pk_name)) if isinstance(item, dict) else None
+                if instance is None:
+                    serializers.append(None)
+                    errors.append({pk_name: ['Not found.']})
+                    continue
+                serializer = self.get_serializer(instance, data=item, partial=True)
+                serializers.append(serializer)
+                errors.append({} if serializer.is_valid() else serializer.errors)
+            if any(errors):
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            fields = {'version'}
+            for serializer in serializers:
+                for name, value in serializer.validated_data.items():
+                    setattr(serializer.instance, name, value)
+                    fields.add(model._meta.get_field(name).name)
+            instances = [serializer.instance for serializer in serializers]
+            errors = self.validate_bulk(instances)
+            if errors:
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+            # The rows are locked, so the in-memory version is the stored one
+            for instance in instances:
+                instance.version += 1
+            model.objects.bulk_update(instances, sorted(fields))
+            self.written()
+        return Response([serializer.data for serializer in serializers])
+
+    def delete(self, request, *args, **kwargs):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids or len(ids) > self.max_items:
+            return Response({"ids": "Expected a list of at most %d ids." % self.max_items},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            queryset = self.get_queryset().filter(pk__in=ids)
+            found = set(queryset.values_list('pk', flat=True))
+            missing = [pk for pk in ids if pk not in found]
+            if missing:
+                return Response({"missing": missing}, status=status.HTTP_400_BAD_REQUEST)
+            queryset.delete()
+            self.written()
+        return Response(status=status.HTTP_204_NO_CONTENT)
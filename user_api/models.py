@@ -1,7 +1,52 @@
-from django.db import models
+import re
+from datetime import timezone as dt_timezone
+
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.contrib.auth.models import User
 
-class Cinema(models.Model):
+def day_bucket(timestamp):
+    return timestamp.astimezone(dt_timezone.utc).date()
+
+
+class DayBucketField(models.DateField):
+    """UTC day of the ``source`` datetime field, filled in on every insert and save."""
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs['editable'] = False
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = day_bucket(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class VersionedModel(models.Model):
+    """Counts saves of a row, the detail endpoints build their ETag from it."""
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+class Cinema(VersionedModel):
     cinema_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=45)
     district = models.CharField(max_length=45)
@@ -13,8 +58,11 @@ class Cinema(models.Model):
     
     class Meta:
         db_table = 'cinema'
+        indexes = [
+            models.Index(fields=['city', 'district'], name='cinema_city_district_idx'),
+        ]
 
-class CinemaHall(models.Model):
+class CinemaHall(VersionedModel):
     cinema_hall_id = models.AutoField(primary_key=True)
     HALL_SIZES = (
         ('S', 'Small'),
@@ -23,6 +71,9 @@ class CinemaHall(models.Model):
     )
     hall_size = models.CharField(max_length=1, choices=HALL_SIZES)
     cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE)
+    # Next free CinemaSeat.seat_index. Positions are never reused, a deleted
+    # seat's bit may still be set in the hall's seat maps.
+    next_seat_index = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return str(self.cinema_hall_id)
@@ -30,20 +81,68 @@ class CinemaHall(models.Model):
     class Meta:
         db_table = 'cinema_hall'
 
-class CinemaSeat(models.Model):
+class CinemaSeat(VersionedModel):
     cinema_seat_id = models.CharField(primary_key=True, max_length=45)
-    booked_shows = models.CharField(max_length=1000, default="")
-    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE)
+    # Served by the (cinema_hall, seat_index) unique index
+    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, db_index=False)
     row_no = models.CharField(max_length=45)
     col_no = models.CharField(max_length=45)
+    # Bit position of the seat in every ShowSeatMap of its hall
+    seat_index = models.PositiveIntegerField(editable=False)
 
     def __str__(self):
         return str(self.cinema_seat_id)
+
+    def save(self, *args, **kwargs):
+        if self.seat_index is None:
+            CinemaSeat.assign_seat_indexes([self])
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def assign_seat_indexes(cls, seats):
+        """Give unsaved seats fresh positions in their hall, for save() and bulk_create()."""
+        new_seats = [seat for seat in seats if seat.seat_index is None]
+        wanted = Counter(seat.cinema_hall_id for seat in new_seats)
+        with transaction.atomic():
+            for hall_id, count in wanted.items():
+                CinemaHall.objects.filter(pk=hall_id).update(next_seat_index=F('next_seat_index') + count)
+            reserved = dict(CinemaHall.objects.filter(pk__in=wanted).values_list('pk', 'next_seat_index'))
+        next_index = {hall_id: reserved[hall_id] - count for hall_id, count in wanted.items()}
+        for seat in new_seats:
+            seat.seat_index = next_index[seat.cinema_hall_id]
+            next_index[seat.cinema_hall_id] += 1
     
     class Meta:
         db_table = 'cinema_seat'
+        unique_together = ('cinema_hall', 'seat_index')
+
+def split_names(value):
+    """Split a comma separated list such as ``Movie.actors`` into clean names."""
+    names = (name.strip() for name in re.split(r'[,|]', value or ''))
+    return list(dict.fromkeys(name for name in names if name))
 
-class Movie(models.Model):
+
+class Genre(models.Model):
+    genre_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'genre'
+
+class Actor(models.Model):
+    actor_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'actor'
+
+class Movie(VersionedModel):
     movie_id = models.AutoField(primary_key=True)
     poster_link = models.CharField(max_length=200,default="")
     title = models.CharField(max_length=100, default="")
@@ -57,18 +156,41 @@ class Movie(models.Model):
     rating = models.FloatField(null=True, blank=True, default=None)
     in_theatre = models.BooleanField(default=True)
     current_datetime = models.DateTimeField(auto_now_add=True)
+    # Normalized copies of the genre and actors strings, kept in sync on save
+    genres = models.ManyToManyField(Genre, related_name='movies', db_table='movie_genre', blank=True)
+    cast = models.ManyToManyField(Actor, related_name='movies', db_table='movie_actor', blank=True)
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        # One transaction, so the cache is invalidated once the relations are set too
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.genres.set(self._lookup(Genre, split_names(self.genre)))
+            self.cast.set(self._lookup(Actor, split_names(self.actors)))
+
+    @staticmethod
+    def _lookup(model, names):
+        model.objects.bulk_create([model(name=name[:100]) for name in names], ignore_conflicts=True)
+        return model.objects.filter(name__in=[name[:100] for name in names])
     
     class Meta:
         db_table = 'movie'
+        indexes = [
+            models.Index(fields=['language', 'in_theatre'], name='movie_language_idx'),
+            models.Index(fields=['release_date'], name='movie_release_date_idx'),
+            # in_theatre=True compiles to a bare "in_theatre" test, which can't
+            # seek into an (in_theatre, ...) index but matches this condition
+            models.Index(fields=['release_date'], condition=Q(in_theatre=True), name='movie_showing_release_idx'),
+        ]
 
-class Show(models.Model):
+class Show(VersionedModel):
     show_id = models.AutoField(primary_key=True)
     date = models.DateTimeField(blank=True, null=True)
-    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE)
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    # Served by show_hall_date_idx and show_movie_date_idx
+    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, db_index=False)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False)
     show_price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
@@ -76,22 +198,134 @@ class Show(models.Model):
     
     class Meta:
         db_table = 'show'
+        indexes = [
+            models.Index(fields=['date'], name='show_date_idx'),
+            models.Index(fields=['movie', 'date'], name='show_movie_date_idx'),
+            models.Index(fields=['cinema_hall', 'date'], name='show_hall_date_idx'),
+        ]
+
+class ShowSeatMap(models.Model):
+    show = models.OneToOneField(Show, primary_key=True, on_delete=models.CASCADE, related_name='seat_map')
+    # Bitset over CinemaSeat.seat_index, a set bit means the seat is booked
+    booked = models.BinaryField(default=b'')
+    version = models.PositiveIntegerField(default=0)
 
-class Ticket(models.Model):
+    def __str__(self):
+        return str(self.show_id)
+
+    class Meta:
+        db_table = 'show_seat_map'
+
+class TicketQuerySet(models.QuerySet):
+    def delete(self):
+        from .stats import forget_tickets
+        with transaction.atomic():
+            forget_tickets(self)
+            return super().delete()
+
+
+class Ticket(VersionedModel):
     ticket_id = models.AutoField(primary_key=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     show = models.ForeignKey(Show, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Served by ticket_user_purchase_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     purchase_time = models.DateTimeField(auto_now_add=True)
     seats = models.CharField(max_length=1000, default="")
 
+    # Deletes take their sales off the totals here rather than in a delete
+    # signal, which would make every cascade from a show load its tickets
+    objects = TicketQuerySet.as_manager()
+
     def __str__(self):
         return str(self.ticket_id)
+
+    def delete(self, *args, **kwargs):
+        from .stats import record_ticket
+        with transaction.atomic():
+            record_ticket(self, sign=-1)
+            return super().delete(*args, **kwargs)
     
     class Meta:
         db_table = 'ticket'
+        indexes = [
+            models.Index(fields=['user', 'purchase_time'], name='ticket_user_purchase_idx'),
+        ]
+
+class SalesTotals(models.Model):
+    tickets_sold = models.IntegerField(default=0)
+    seats_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-class Log(models.Model):
+    class Meta:
+        abstract = True
+
+class ShowStats(SalesTotals):
+    show = models.OneToOneField(Show, primary_key=True, on_delete=models.CASCADE, related_name='stats')
+    # Seats in the hall when the first ticket was sold, refreshed by rebuild_sales_stats
+    capacity = models.PositiveIntegerField(default=0)
+
+    @property
+    def seats_remaining(self):
+        return max(self.capacity - self.seats_sold, 0)
+
+    def __str__(self):
+        return str(self.show_id)
+
+    class Meta:
+        db_table = 'show_stats'
+
+class MovieDailyStats(SalesTotals):
+    # Served by the (movie, day) unique index
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False)
+    # UTC day of the ticket purchases
+    day = models.DateField()
+
+    class Meta:
+        db_table = 'movie_daily_stats'
+        unique_together = ('movie', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='movie_daily_stats_day_idx'),
+        ]
+
+class CinemaDailyStats(SalesTotals):
+    # Served by the (cinema, day) unique index
+    cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+
+    class Meta:
+        db_table = 'cinema_daily_stats'
+        unique_together = ('cinema', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='cinema_daily_stats_day_idx'),
+        ]
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=32, primary_key=True)
+    # Rows can be dropped once the token would have expired anyway
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+    class Meta:
+        db_table = 'revoked_token'
+
+class Log(VersionedModel):
     message = models.CharField(max_length=255)
     level = models.CharField(max_length=20)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the record is received, which for batched logs is before the INSERT
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Retention drops and archives whole days
+    bucket = DayBucketField(source='timestamp')
+
+    @staticmethod
+    def bucket_for(timestamp):
+        return day_bucket(timestamp)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'level'], name='log_bucket_level_idx'),
+            models.Index(fields=['level', 'timestamp'], name='log_level_timestamp_idx'),
+            models.Index(fields=['timestamp'], name='log_timestamp_idx'),
+        ]
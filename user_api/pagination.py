@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over the primary key.
+
+    Each page is a ``pk < last_seen`` range scan on the primary key index, so
+    deep pages cost the same as the first one.
+    """
+    ordering = '-pk'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
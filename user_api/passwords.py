@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class HasherPool:
+    """
+    Fixed set of threads that run password hashing off the request threads.
+
+    hashlib releases the GIL while it hashes, so the pool uses real cores while
+    request threads only wait on a future. At most ``workers + queue_size`` jobs
+    are admitted, later ones are refused at once so a login storm turns into
+    quick 503s instead of every request worker stuck behind the hasher.
+    """
+
+    def __init__(self, workers=4, queue_size=32, timeout=10.0):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._queued = self._running = 0
+        self._completed = self._rejected = self._timeouts = 0
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy('Too many logins in progress, retry later.')
+        with self._lock:
+            self._queued += 1
+        future = self._executor.submit(self._call, func, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise HasherBusy('Password check timed out, retry later.')
+
+    def _call(self, func, args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'running': self._running,
+                'queued': self._queued,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+            }
+
+
+_pool = None
+
+
+def get_hasher_pool():
+    global _pool
+    if _pool is None:
+        _pool = HasherPool(
+            workers=settings.PASSWORD_HASH_WORKERS,
+            queue_size=settings.PASSWORD_HASH_QUEUE,
+            timeout=settings.PASSWORD_HASH_TIMEOUT,
+        )
+    return _pool
+
+
+def hash_password(password):
+    return get_hasher_pool().run(hashers.make_password, password)
+
+
+def verify_password(password, encoded):
+    """Check without the rehash-and-save that User.check_password would do on the pool thread."""
+    return get_hasher_pool().run(hashers.check_password, password, encoded)
+
+
+def needs_rehash(encoded):
+    """True if ``encoded`` is not from the preferred hasher at its configured cost."""
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def upgrade_password(user, password):
+    """Re-hash a just verified ``password`` if the hasher profile or cost changed."""
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+        return True
+    return False
@@ -0,0 +1,21 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def ndjson_line(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(row) for row in rows).encode(self.charset)
@@ -0,0 +1,72 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Catalog data changes rarely and tolerates a few seconds of replication lag
+CATALOG_MODELS = {'cinema', 'cinemahall', 'cinemaseat', 'movie', 'genre', 'actor', 'show'}
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def pinned_to_primary():
+    return _pinned.get()
+
+
+def pin_to_primary(pinned=True):
+    """Route the reads of the current request (or task) to the primary, returns a reset token."""
+    return _pinned.set(pinned)
+
+
+def unpin(token):
+    _pinned.reset(token)
+
+
+@contextmanager
+def primary():
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Catalog reads go to a random replica, everything else to the primary.
+
+    Reads stay on the primary while a transaction is open there, and while
+    the request is pinned because its client wrote recently (see
+    ReadYourWritesMiddleware). Without replicas configured it routes nothing.
+    """
+
+    def __init__(self, replicas=None):
+        self._replicas = replicas
+
+    @property
+    def replicas(self):
+        if self._replicas is None:
+            self._replicas = [alias for alias in connections if alias != 'default']
+        return self._replicas
+
+    def is_catalog(self, model):
+        owner = model._meta.auto_created or model
+        return owner._meta.app_label == 'user_api' and owner._meta.model_name in CATALOG_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas:
+            return None
+        if not self.is_catalog(model) or pinned_to_primary() or connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,149 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Movie, Show
+
+
+def cleaning_buffer(minutes=None):
+    return timedelta(minutes=settings.SHOW_CLEANING_BUFFER if minutes is None else minutes)
+
+
+class HallTimeline:
+    """
+    Shows of one hall as ``(start, end, key)`` intervals sorted by start.
+
+    A lookup bisects to the first show starting after the candidate ends and
+    walks back only as far as the longest show could reach, so checking a show
+    costs O(log n) plus the handful of neighbours instead of a pass over the hall.
+    """
+
+    def __init__(self, buffer=timedelta()):
+        self.buffer = buffer
+        self._intervals = []
+        self._longest = timedelta()
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def add(self, start, end, key=None):
+        insort(self._intervals, (start, end, key), key=lambda interval: interval[0])
+        self._longest = max(self._longest, end - start)
+
+    def conflicts(self, start, end, exclude=None):
+        """Intervals closer than the cleaning buffer to ``[start, end)``."""
+        found = []
+        index = bisect_left(self._intervals, end + self.buffer, key=lambda interval: interval[0])
+        earliest = start - self.buffer - self._longest
+        while index > 0:
+            index -= 1
+            interval = self._intervals[index]
+            if interval[0] <= earliest:
+                break
+            if interval[1] + self.buffer > start and interval[2] != exclude:
+                found.append(interval)
+        found.reverse()
+        return found
+
+    def free_slot(self, start, length, latest):
+        """Earliest start at or after ``start`` for a show of ``length`` ending by ``latest``."""
+        while start + length <= latest:
+            found = self.conflicts(start, start + length)
+            if not found:
+                return start
+            start = max(interval[1] for interval in found) + self.buffer
+        return None
+
+
+def show_interval(date, duration):
+    return date, date + timedelta(minutes=duration)
+
+
+def load_timelines(hall_ids, start, end, buffer, exclude=()):
+    """One timeline per hall holding every stored show that could touch ``[start, end)``."""
+    longest = Movie.objects.aggregate(longest=Max('duration'))['longest'] or 0
+    shows = (Show.objects
+             .filter(cinema_hall_id__in=hall_ids,
+                     date__gt=start - buffer - timedelta(minutes=longest),
+                     date__lt=end + buffer)
+             .exclude(pk__in=exclude)
+             .values_list('pk', 'cinema_hall_id', 'date', 'movie__duration'))
+    timelines = {hall_id: HallTimeline(buffer) for hall_id in hall_ids}
+    for pk, hall_id, date, duration in shows:
+        timelines[hall_id].add(*show_interval(date, duration), pk)
+    return timelines
+
+
+def find_overlaps(shows, buffer=None):
+    """
+    Check new or changed ``shows`` against the stored schedule and each other.
+
+    Returns one list of conflicting show keys per item, empty when the show fits.
+    Stored versions of shows being changed are ignored. Unsaved shows are keyed
+    by their position in ``shows`` as ``"item <n>"``.
+    """
+    buffer = cleaning_buffer(buffer)
+    planned = [show for show in shows if show.date is not None]
+    if not planned:
+        return [[] for _ in shows]
+    durations = dict(Movie.objects.filter(pk__in={show.movie_id for show in planned})
+                     .values_list('pk', 'duration'))
+    intervals = [show_interval(show.date, durations[show.movie_id]) for show in planned]
+    timelines = load_timelines({show.cinema_hall_id for show in planned},
+                               min(start for start, _ in intervals), max(end for _, end in intervals),
+                               buffer, exclude=[show.pk for show in planned if show.pk])
+
+    result = []
+    for position, show in enumerate(shows):
+        if show.date is None:
+            result.append([])
+            continue
+        start, end = show_interval(show.date, durations[show.movie_id])
+        timeline = timelines[show.cinema_hall_id]
+        result.append([key for _, _, key in timeline.conflicts(start, end)])
+        timeline.add(start, end, show.pk or 'item %d' % position)
+    return result
+
+
+def daily_windows(date_from, date_to, opens, closes):
+    """``(start, end)`` of each business day, a ``closes`` before ``opens`` means after midnight."""
+    day = date_from
+    while day <= date_to:
+        start = timezone.make_aware(datetime.combine(day, opens))
+        end = timezone.make_aware(datetime.combine(day, closes))
+        if end <= start:
+            end += timedelta(days=1)
+        yield start, end
+        day += timedelta(days=1)
+
+
+def generate_schedule(movie, halls, date_from, date_to, opens, closes, show_price, buffer=None):
+    """
+    Fill each hall's business hours with back-to-back shows of ``movie``.
+
+    Shows already booked into a hall are kept and the new ones are placed in the
+    gaps around them. Returns unsaved Show instances in hall and start order.
+    """
+    buffer = cleaning_buffer(buffer)
+    length = timedelta(minutes=movie.duration)
+    windows = list(daily_windows(date_from, date_to, opens, closes))
+    if not windows:
+        return []
+    timelines = load_timelines([hall.pk for hall in halls], windows[0][0], windows[-1][1], buffer)
+
+    shows = []
+    for hall in halls:
+        timeline = timelines[hall.pk]
+        for start, end in windows:
+            slot = timeline.free_slot(start, length, end)
+            while slot is not None:
+                timeline.add(slot, slot + length)
+                shows.append(Show(cinema_hall=hall, movie=movie, date=slot, show_price=show_price))
+                slot = timeline.free_slot(slot + length + buffer, length, end)
+    return shows
@@ -0,0 +1,68 @@
+import re
+
+from django.db import connection
+
+from .models import Movie
+
+# bm25 column weights for title, actors, director, about
+SQLITE_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+# Migration 0013 creates movie_fts and a GIN index on this document, a change
+# here needs a migration that rebuilds the index
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(actors, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(director, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(about, '')), 'D')"
+)
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def index_movie(movie):
+    """Refresh one movie in the SQLite FTS table, Postgres indexes the expression itself."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM movie_fts WHERE rowid = %s", [movie.pk])
+        cursor.execute(
+            "INSERT INTO movie_fts (rowid, title, actors, director, about) VALUES (%s, %s, %s, %s, %s)",
+            [movie.pk, movie.title, movie.actors, movie.director, movie.about],
+        )
+
+
+def unindex_movie(pk):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM movie_fts WHERE rowid = %s", [pk])
+
+
+def search_movies(query, limit=20):
+    """
+    Ranked full-text search over title, actors, director and about. Every
+    term matches as a prefix so partial input works for typeahead.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if connection.vendor == 'sqlite':
+        return list(Movie.objects.raw(
+            "SELECT movie.* FROM movie_fts JOIN movie ON movie.movie_id = movie_fts.rowid "
+            "WHERE movie_fts MATCH %s ORDER BY bm25(movie_fts, {}) LIMIT %s".format(
+                ', '.join(str(weight) for weight in SQLITE_WEIGHTS)),
+            [' '.join('"%s"*' % token for token in tokens), limit],
+        ))
+    if connection.vendor == 'postgresql':
+        return list(Movie.objects.raw(
+            "SELECT movie.* FROM movie, to_tsquery('simple', %s) query "
+            "WHERE ({document}) @@ query ORDER BY ts_rank(({document}), query) DESC LIMIT %s".format(
+                document=POSTGRES_DOCUMENT),
+            [' & '.join('%s:*' % token for token in tokens), limit],
+        ))
+    movies = Movie.objects.all()
+    for token in tokens:
+        movies = movies.filter(title__icontains=token)
+    return list(movies[:limit])
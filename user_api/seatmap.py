@@ -0,0 +1,113 @@
+from .models import CinemaSeat, ShowSeatMap
+
+
+class SeatConflict(Exception):
+    def __init__(self, seats):
+        super().__init__('Seats are no longer available: %s' % ', '.join(seats))
+        self.seats = seats
+
+
+class UnknownSeats(Exception):
+    def __init__(self, seats):
+        super().__init__('Seats do not belong to this show: %s' % ', '.join(seats))
+        self.seats = seats
+
+
+class SeatBitmap:
+    """Compact set of seat indexes, one bit per seat of a hall layout."""
+
+    def __init__(self, data=b''):
+        self._bits = bytearray(data)
+
+    def __contains__(self, index):
+        byte = index >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (index & 7)))
+
+    def __iter__(self):
+        for byte_no, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield (byte_no << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def __len__(self):
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+    def add(self, index):
+        byte = index >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (index & 7)
+
+    def discard(self, index):
+        byte = index >> 3
+        if byte < len(self._bits):
+            self._bits[byte] &= ~(1 << (index & 7)) & 0xFF
+
+    def to_bytes(self):
+        return bytes(self._bits.rstrip(b'\x00'))
+
+
+def get_booked(show):
+    try:
+        return SeatBitmap(show.seat_map.booked)
+    except ShowSeatMap.DoesNotExist:
+        return SeatBitmap()
+
+
+def resolve_seats(show, seat_ids):
+    """
+    Map seat ids to their bit positions in the show's hall layout. Read from the
+    primary, the seat maps written with them must not trail a lagging replica.
+    """
+    indexes = dict(CinemaSeat.objects.using('default').filter(cinema_hall_id=show.cinema_hall_id, pk__in=seat_ids)
+                   .values_list('cinema_seat_id', 'seat_index'))
+    unknown = [seat_id for seat_id in seat_ids if seat_id not in indexes]
+    if unknown:
+        raise UnknownSeats(unknown)
+    return indexes
+
+
+def booked_among(show_id, seat_ids):
+    """The seats of ``seat_ids`` that are booked for the show."""
+    booked = ShowSeatMap.objects.filter(pk=show_id).values_list('booked', flat=True).first()
+    if not booked:
+        return set()
+    booked = SeatBitmap(booked)
+    indexes = (CinemaSeat.objects.using('default').filter(cinema_hall__show=show_id, pk__in=seat_ids)
+               .values_list('cinema_seat_id', 'seat_index'))
+    return {seat_id for seat_id, index in indexes if index in booked}
+
+
+def seat_map_payload(show, booked, seats):
+    """Annotate ``seats`` (dicts, in seat_index order) with their booked and held state."""
+    from .holds import get_hold_store
+
+    held = get_hold_store().holders(show.pk, [seat['cinema_seat_id'] for seat in seats])
+    for seat in seats:
+        seat['booked'] = seat['seat_index'] in booked
+        seat['held'] = not seat['booked'] and seat['cinema_seat_id'] in held
+    return {
+        'show': show.pk,
+        'cinema_hall': show.cinema_hall_id,
+        'capacity': len(seats),
+        'available': sum(1 for seat in seats if not seat['booked'] and not seat['held']),
+        'seats': seats,
+    }
+
+
+def hall_seats(show):
+    return (CinemaSeat.objects.filter(cinema_hall_id=show.cinema_hall_id)
+            .order_by('seat_index')
+            .values('cinema_seat_id', 'row_no', 'col_no', 'seat_index'))
+
+
+def build_seat_map(show):
+    return seat_map_payload(show, get_booked(show), list(hall_seats(show)))
+
+
+async def abuild_seat_map(show):
+    """build_seat_map() on the async ORM."""
+    booked = await ShowSeatMap.objects.filter(pk=show.pk).values_list('booked', flat=True).afirst()
+    seats = [seat async for seat in hall_seats(show)]
+    return seat_map_payload(show, SeatBitmap(booked or b''), seats)
@@ -1,21 +1,64 @@
+import datetime
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.validators import UniqueValidator
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from django.core.exceptions import ValidationError
-from .models import Cinema, CinemaHall, CinemaSeat, Movie, Show, Ticket, Log
+from .models import (Cinema, CinemaHall, CinemaSeat, Movie, Show, ShowSeatMap, Ticket, Log, ShowStats,
+                     MovieDailyStats, CinemaDailyStats)
+from .scheduling import find_overlaps
+from .passwords import hash_password, upgrade_password
+from .validations import USERNAME_TAKEN, find_taken
+
+def parse_expand(paths):
+    """Turn ``['movie', 'cinema_hall.cinema']`` into ``{'movie': {}, 'cinema_hall': {'cinema': {}}}``."""
+    tree = {}
+    for path in paths:
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class ExpandableFieldsMixin:
+    """
+    Replace foreign key ids by nested objects for the relations listed in
+    ``expand``, e.g. ``expand=['movie', 'cinema_hall.cinema']``.
+    """
+    expandable_fields = {}
 
-class CinemaSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand is None:
+            expand = parse_expand(self.context.get('expand', ()))
+        for name, children in expand.items():
+            if name in self.expandable_fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True, expand=children)
+
+    @classmethod
+    def expandable_paths(cls, prefix=''):
+        paths = []
+        for name, serializer_class in cls.expandable_fields.items():
+            paths.append(prefix + name)
+            paths.extend(serializer_class.expandable_paths(prefix + name + '.'))
+        return paths
+
+
+class CinemaSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Cinema
         fields = '__all__'
 
 
-class CinemaHallSerializer(serializers.ModelSerializer):
+class CinemaHallSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'cinema': CinemaSerializer}
+
     class Meta:
         model = CinemaHall
-        fields = '__all__'
+        exclude = ('next_seat_index',)
 
 
 class CinemaSeatSerializer(serializers.ModelSerializer):
@@ -23,23 +66,158 @@ class CinemaSeatSerializer(serializers.ModelSerializer):
         model = CinemaSeat
         fields = '__all__'
 
+    def validate(self, attrs):
+        # seat_index is a position in the hall's seat maps, it means nothing in another hall
+        if self.instance and 'cinema_hall' in attrs and attrs['cinema_hall'] != self.instance.cinema_hall:
+            raise serializers.ValidationError(
+                {"cinema_hall": "A seat can't move to another hall, delete it and add a new one there."})
+        return attrs
 
-class MovieSerializer(serializers.ModelSerializer):
+
+class MovieSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Movie
-        fields = '__all__'
+        # The relations mirror the genre and actors strings
+        exclude = ('genres', 'cast')
+
 
+class ShowSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'movie': MovieSerializer, 'cinema_hall': CinemaHallSerializer}
 
-class ShowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Show
         fields = '__all__'
 
+    def validate(self, attrs):
+        # Booked seats are positions in the hall's layout, they mean nothing in another hall
+        if self.moves('cinema_hall', attrs) and self.has_bookings():
+            raise serializers.ValidationError(
+                {"cinema_hall": "Seats of this show are booked, it can't move to another hall."})
+        # The sales totals count the show's tickets for its movie
+        if self.moves('movie', attrs) and Ticket.objects.filter(show=self.instance).exists():
+            raise serializers.ValidationError({"movie": "Tickets of this show are sold, its movie can't change."})
+        # Bulk views check the whole batch at once in validate_bulk
+        if not self.context.get('check_overlaps', True):
+            return attrs
+        if self.instance and not {'date', 'cinema_hall', 'movie'} & set(attrs):
+            return attrs
+        show = Show(pk=self.instance.pk if self.instance else None)
+        for name in ('date', 'cinema_hall', 'movie'):
+            value = attrs[name] if name in attrs else getattr(self.instance, name, None)
+            setattr(show, name, value)
+        overlaps = find_overlaps([show])[0]
+        if overlaps:
+            raise serializers.ValidationError(
+                {"date": "Overlaps show %s in this cinema hall." % ', '.join(map(str, overlaps))})
+        return attrs
+
+    def moves(self, name, attrs):
+        field = Show._meta.get_field(name)
+        return (self.instance is not None and name in attrs
+                and attrs[name].pk != getattr(self.instance, field.attname))
+
+    def has_bookings(self):
+        return (ShowSeatMap.objects.filter(show=self.instance).exists()
+                or Ticket.objects.filter(show=self.instance).exists())
+
+
+class TicketSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'show': ShowSerializer}
 
-class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = '__all__'
+        # The seats are in the show's seat map, only booking and cancelling change them
+        read_only_fields = ('show', 'user', 'price', 'seats')
+
+
+class ShowStatsSerializer(serializers.ModelSerializer):
+    seats_remaining = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ShowStats
+        fields = ('show', 'tickets_sold', 'seats_sold', 'seats_remaining', 'capacity', 'revenue')
+
+
+class MovieDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MovieDailyStats
+        fields = ('movie', 'day', 'tickets_sold', 'seats_sold', 'revenue')
+
+
+class CinemaDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CinemaDailyStats
+        fields = ('cinema', 'day', 'tickets_sold', 'seats_sold', 'revenue')
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    tickets_sold = serializers.IntegerField()
+    seats_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class MovieSalesTotalsSerializer(SalesTotalsSerializer):
+    movie = serializers.IntegerField()
+
+
+class CinemaSalesTotalsSerializer(SalesTotalsSerializer):
+    cinema = serializers.IntegerField()
+
+
+class FacetSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class HallLayoutSerializer(serializers.Serializer):
+    rows = serializers.IntegerField(min_value=1, max_value=100)
+    cols = serializers.IntegerField(min_value=1, max_value=100)
+    row_labels = serializers.ListField(child=serializers.CharField(max_length=10), required=False)
+
+    def validate(self, attrs):
+        labels = attrs.get('row_labels')
+        if labels is not None and len(labels) != attrs['rows']:
+            raise serializers.ValidationError({"row_labels": "Expected one label per row."})
+        if labels is not None and len(set(labels)) != len(labels):
+            raise serializers.ValidationError({"row_labels": "Row labels must be unique."})
+        return attrs
+
+
+class ScheduleSerializer(serializers.Serializer):
+    movie = serializers.PrimaryKeyRelatedField(queryset=Movie.objects.all())
+    cinema_halls = serializers.PrimaryKeyRelatedField(queryset=CinemaHall.objects.all(), many=True,
+                                                      allow_empty=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    opens = serializers.TimeField(default=datetime.time(10, 0))
+    closes = serializers.TimeField(default=datetime.time(23, 59))
+    buffer = serializers.IntegerField(min_value=0, max_value=240, required=False)
+    show_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    commit = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if attrs['date_to'] < attrs['date_from']:
+            raise serializers.ValidationError({"date_to": "Must not be before date_from."})
+        if (attrs['date_to'] - attrs['date_from']).days > 31:
+            raise serializers.ValidationError({"date_to": "At most 31 days per request."})
+        if attrs['movie'].duration <= 0:
+            raise serializers.ValidationError({"movie": "Movie has no duration."})
+        return attrs
+
+
+class BookingSerializer(serializers.Serializer):
+    seats = serializers.ListField(child=serializers.CharField(max_length=45), allow_empty=False, max_length=100)
+    hold = serializers.CharField(required=False)
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    hold_id = serializers.CharField(read_only=True)
+    show = serializers.IntegerField(source='show_id', read_only=True)
+    seats = serializers.ListField(child=serializers.CharField(max_length=45), allow_empty=False,
+                                  max_length=settings.SEAT_HOLD_MAX_SEATS)
+    ttl = serializers.IntegerField(min_value=1, max_value=settings.SEAT_HOLD_MAX_TTL, required=False, write_only=True)
+    expires_at = serializers.DateTimeField(source='expires', read_only=True)
 
 
 class LogSerializer(serializers.ModelSerializer):
@@ -50,10 +228,8 @@ class LogSerializer(serializers.ModelSerializer):
 
 # Register Serializer
 class RegisterSerializer(serializers.ModelSerializer):
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())]
-    )
+    # Uniqueness is checked for both fields at once in validate()
+    email = serializers.EmailField(required=True)
 
     password = serializers.CharField(
         write_only=True, required=True, validators=[validate_password])
@@ -62,35 +238,56 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'password2')
+        extra_kwargs = {'username': {'validators': [UnicodeUsernameValidator()]}}
 
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError(
                 {"password": "Password fields didn't match."})
+        taken = find_taken(attrs['username'], attrs['email'])
+        if taken:
+            raise serializers.ValidationError(taken)
         return attrs
 
     def create(self, validated_data):
-        user = User.objects.create(
-            username=validated_data['username'],
-            email=validated_data['email'],
-        )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
+        # Hashed on the hasher pool, then a single INSERT
+        password = hash_password(validated_data['password'])
+        try:
+            with transaction.atomic():
+                return User.objects.create(
+                    username=validated_data['username'],
+                    email=validated_data['email'],
+                    password=password,
+                )
+        except IntegrityError:
+            # Somebody registered the same name or email since validate()
+            raise serializers.ValidationError(
+                find_taken(validated_data['username'], validated_data['email']) or
+                {"username": [USERNAME_TAKEN]})
 
 
 # User Login Serializer
 class UserLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
+    # Token clients don't need a session row, the browser pages (password change) do
+    session = serializers.BooleanField(default=False)
 
     def check_user(self, clean_data):
         user = authenticate(
             username=clean_data['username'], password=clean_data['password'])
         if not user:
-            raise ValidationError('User not found with the given credentials!')
+            raise serializers.ValidationError('User not found with the given credentials!')
+        upgrade_password(user, clean_data['password'])
         return user
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
 # User Serializer
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
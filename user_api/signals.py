@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_generation
+from .models import Cinema, CinemaHall, Movie, Show, Ticket
+from .search import index_movie, unindex_movie
+from .stats import SALE_FIELDS, forget_tickets, record_change, record_ticket
+from .tokens import forget_user
+
+CATALOG_MODELS = (Cinema, CinemaHall, Movie, Show)
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, **kwargs):
+    index_movie(instance)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    unindex_movie(instance.pk)
+
+
+@receiver(pre_save, sender=Ticket)
+def ticket_saving(sender, instance, **kwargs):
+    instance._counted = None if instance._state.adding else (
+        Ticket.objects.filter(pk=instance.pk).values(*SALE_FIELDS).first())
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    if created:
+        record_ticket(instance)
+    else:
+        record_change(instance, instance._counted)
+
+
+# Cascaded ticket deletes skip Ticket.delete, their sales go with the show or user
+@receiver(pre_delete, sender=Show)
+def show_deleting(sender, instance, **kwargs):
+    forget_tickets(Ticket.objects.filter(show=instance))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    forget_tickets(Ticket.objects.filter(user=instance))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Deactivated and deleted users lose their access tokens now, not after JWT_USER_TTL
+    forget_user(instance.pk)
+
+
+def catalog_changed(sender, **kwargs):
+    # After commit: bumped earlier, a concurrent read could cache the old rows
+    # under the new generation
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+# Connected per model: a catch-all receiver would disable fast bulk deletes everywhere
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model)
+    post_delete.connect(catalog_changed, sender=model)
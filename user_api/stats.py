@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import CinemaDailyStats, CinemaSeat, MovieDailyStats, ShowStats, Ticket, day_bucket
+
+# What a ticket adds to the totals
+SALE_FIELDS = ('show_id', 'price', 'seats', 'purchase_time')
+
+
+def seat_count(seats):
+    return sum(1 for seat_id in (seats or '').split(',') if seat_id)
+
+
+def _add(model, lookup, delta, defaults=None):
+    """
+    Add ``delta`` to the totals row matching ``lookup``. A missing row is
+    created from ``defaults()`` unless ``defaults`` is None.
+    """
+    changes = {name: F(name) + value for name, value in delta.items()}
+    if model.objects.filter(**lookup).update(**changes) or defaults is None:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults(), **delta)
+    except IntegrityError:
+        # Somebody else created the row first
+        model.objects.filter(**lookup).update(**changes)
+
+
+def record_ticket(ticket, sign=1):
+    """
+    Apply one ticket sale (``sign=1``) or cancellation (``sign=-1``) to the
+    show, movie and cinema totals, in the caller's transaction. Cancellations
+    never create rows, the totals may already be gone with a deleted show.
+    """
+    show = ticket.show
+    delta = {'tickets_sold': sign, 'seats_sold': sign * seat_count(ticket.seats), 'revenue': sign * ticket.price}
+    day = day_bucket(ticket.purchase_time)
+    new_row = dict if sign > 0 else None
+
+    def capacity():
+        return {'capacity': CinemaSeat.objects.filter(cinema_hall_id=show.cinema_hall_id).count()}
+
+    _add(ShowStats, {'show_id': show.pk}, delta, capacity if new_row else None)
+    _add(MovieDailyStats, {'movie_id': show.movie_id, 'day': day}, delta, new_row)
+    _add(CinemaDailyStats, {'cinema_id': show.cinema_hall.cinema_id, 'day': day}, delta, new_row)
+
+
+def record_change(ticket, counted):
+    """
+    Move an edited sale's totals, ``counted`` holds the ticket's SALE_FIELDS
+    as they were before the save.
+    """
+    if counted is None or counted == {name: getattr(ticket, name) for name in SALE_FIELDS}:
+        return
+    record_ticket(Ticket(**counted), sign=-1)
+    record_ticket(ticket)
+
+
+def _sum_sales(tickets):
+    """Totals of ``tickets`` per show, (movie, day) and (cinema, day), and the hall of every show."""
+    def totals():
+        return {'tickets_sold': 0, 'seats_sold': 0, 'revenue': Decimal('0')}
+
+    shows, movies, cinemas, halls = {}, {}, {}, {}
+    rows = tickets.values_list('show_id', 'show__cinema_hall_id', 'show__movie_id', 'show__cinema_hall__cinema_id',
+                               'purchase_time', 'price', 'seats')
+    for show_id, hall_id, movie_id, cinema_id, purchase_time, price, seats in rows.iterator(chunk_size=5000):
+        day = day_bucket(purchase_time)
+        halls[show_id] = hall_id
+        for row in (shows.setdefault(show_id, totals()), movies.setdefault((movie_id, day), totals()),
+                    cinemas.setdefault((cinema_id, day), totals())):
+            row['tickets_sold'] += 1
+            row['seats_sold'] += seat_count(seats)
+            row['revenue'] += price
+    return shows, movies, cinemas, halls
+
+
+def forget_tickets(tickets):
+    """
+    Take the sales of ``tickets``, a Ticket queryset about to be deleted, off
+    the totals. One read for all of them, then one update per totals row.
+    """
+    shows, movies, cinemas, _ = _sum_sales(tickets)
+
+    def minus(row):
+        return {name: -value for name, value in row.items()}
+
+    for show_id, row in shows.items():
+        _add(ShowStats, {'show_id': show_id}, minus(row))
+    for (movie_id, day), row in movies.items():
+        _add(MovieDailyStats, {'movie_id': movie_id, 'day': day}, minus(row))
+    for (cinema_id, day), row in cinemas.items():
+        _add(CinemaDailyStats, {'cinema_id': cinema_id, 'day': day}, minus(row))
+
+
+def rebuild_sales_stats():
+    """Recompute every totals table from the tickets, returns the number of tickets read."""
+    shows, movies, cinemas, halls = _sum_sales(Ticket.objects.all())
+    capacity = dict(CinemaSeat.objects.filter(cinema_hall_id__in=set(halls.values()))
+                    .values('cinema_hall_id').annotate(seats=Count('pk'))
+                    .values_list('cinema_hall_id', 'seats'))
+    with transaction.atomic():
+        for model in (ShowStats, MovieDailyStats, CinemaDailyStats):
+            model.objects.all().delete()
+        ShowStats.objects.bulk_create(
+            ShowStats(show_id=show_id, capacity=capacity.get(halls[show_id], 0), **row)
+            for show_id, row in shows.items())
+        MovieDailyStats.objects.bulk_create(
+            MovieDailyStats(movie_id=movie_id, day=day, **row) for (movie_id, day), row in movies.items())
+        CinemaDailyStats.objects.bulk_create(
+            CinemaDailyStats(cinema_id=cinema_id, day=day, **row) for (cinema_id, day), row in cinemas.items())
+    return sum(row['tickets_sold'] for row in shows.values())
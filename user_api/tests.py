@@ -1,3 +1,1372 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+import threading
+from io import StringIO
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db import router as db_router
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import async_views, events, holds, logbuffer, views
+from .middleware import PIN_COOKIE, ReadYourWritesMiddleware
+from .booking import book_seats, cancel_ticket
+from .models import (Cinema, CinemaDailyStats, CinemaHall, CinemaSeat, Log, Movie, MovieDailyStats, Show,
+                     ShowSeatMap, ShowStats, Ticket)
+from .passwords import HasherBusy, HasherPool, get_hasher_pool
+from .routers import PrimaryReplicaRouter, pinned_to_primary, primary
+from .scheduling import HallTimeline, find_overlaps
+from .stats import rebuild_sales_stats
+from .throttling import LoginUsernameThrottle
+from .tokens import issue_pair
+from .validations import EMAIL_TAKEN, USERNAME_TAKEN, find_taken
+from .seatmap import SeatBitmap, SeatConflict, build_seat_map, resolve_seats
+
+
+def create_show(rows=2, cols=5):
+    cinema = Cinema.objects.create(name='Regal', district='Central', city='Delhi')
+    hall = CinemaHall.objects.create(hall_size='S', cinema=cinema)
+    for row in range(rows):
+        for col in range(cols):
+            row_no, col_no = 'ABCDEFGHIJ'[row], str(col + 1)
+            CinemaSeat.objects.create(cinema_seat_id=row_no + col_no, cinema_hall=hall, row_no=row_no, col_no=col_no)
+    movie = Movie.objects.create(title='Dune', genre='Sci-Fi', release_date=datetime(2024, 3, 1, tzinfo=timezone.utc),
+                                 actors='Timothee Chalamet, Zendaya', director='Denis Villeneuve', duration=166,
+                                 language='English', about='Spice')
+    return Show.objects.create(date=datetime(2024, 3, 2, 18, tzinfo=timezone.utc), cinema_hall=hall,
+                               movie=movie, show_price=Decimal('250.00'))
+
+
+def seed_catalog(cinemas=50, halls=4, seats=20, movies=1000, shows=5000, users=500, tickets=20000):
+    """A dataset big enough that the query planner's choices show, made with bulk inserts."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cinema_rows = Cinema.objects.bulk_create(
+        Cinema(name='Cinema %d' % i, district='District %d' % (i % 20), city='City %d' % (i % 10))
+        for i in range(cinemas))
+    hall_rows = CinemaHall.objects.bulk_create(
+        CinemaHall(hall_size='M', cinema=cinema, next_seat_index=seats) for cinema in cinema_rows for _ in range(halls))
+    CinemaSeat.objects.bulk_create(
+        CinemaSeat(cinema_seat_id='%d-%d' % (hall.pk, seat), cinema_hall=hall, row_no='A', col_no=str(seat),
+                   seat_index=seat)
+        for hall in hall_rows for seat in range(seats))
+    movie_rows = Movie.objects.bulk_create(
+        Movie(title='Movie %d' % i, language='Language %d' % (i % 20), in_theatre=i % 10 == 0,
+              release_date=start - timedelta(days=i), duration=120)
+        for i in range(movies))
+    show_rows = Show.objects.bulk_create(
+        Show(date=start + timedelta(hours=3 * i), cinema_hall=hall_rows[i % len(hall_rows)],
+             movie=movie_rows[i % len(movie_rows)], show_price=Decimal('10.00'))
+        for i in range(shows))
+    user_rows = User.objects.bulk_create(User(username='viewer%d' % i) for i in range(users))
+    # Sales spread over a year rather than all stamped now
+    with mock.patch.object(Ticket._meta.get_field('purchase_time'), 'auto_now_add', False):
+        Ticket.objects.bulk_create(
+            Ticket(show=show_rows[i % len(show_rows)], user=user_rows[i % len(user_rows)], price=Decimal('10.00'),
+                   seats='%d-%d' % (show_rows[i % len(show_rows)].cinema_hall_id, i % seats),
+                   purchase_time=start + timedelta(days=i % 365, minutes=i % 1440))
+            for i in range(tickets))
+    rebuild_sales_stats()
+
+
+class SeatBitmapTests(TestCase):
+    def test_add_discard_iterate(self):
+        bitmap = SeatBitmap()
+        for index in (0, 7, 8, 299):
+            bitmap.add(index)
+        bitmap.discard(7)
+        self.assertEqual(list(bitmap), [0, 8, 299])
+        self.assertEqual(len(bitmap), 3)
+        self.assertIn(299, SeatBitmap(bitmap.to_bytes()))
+        self.assertNotIn(300, bitmap)
+
+
+class SeatIndexTests(TestCase):
+    def test_deleted_seat_positions_are_not_reused(self):
+        show = create_show(rows=1, cols=3)
+        book_seats(show, User.objects.create(username='alice'), ['A3'])
+        CinemaSeat.objects.get(pk='A3').delete()
+        seat = CinemaSeat.objects.create(cinema_seat_id='A4', cinema_hall=show.cinema_hall, row_no='A', col_no='4')
+        self.assertEqual(seat.seat_index, 3)
+        self.assertFalse(build_seat_map(show)['seats'][-1]['booked'])
+
+    def test_seat_cannot_move_to_another_hall(self):
+        show = create_show(rows=1, cols=2)
+        other = CinemaHall.objects.create(hall_size='S', cinema=show.cinema_hall.cinema)
+        response = self.client.patch(reverse('cinema-seat-detail', args=['A1']), {'cinema_hall': other.pk},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cinema_hall', response.json())
+
+    def test_booked_show_cannot_move_to_another_hall(self):
+        show = create_show(rows=1, cols=2)
+        other = CinemaHall.objects.create(hall_size='S', cinema=show.cinema_hall.cinema)
+        url = reverse('show-detail', args=[show.pk])
+        response = self.client.patch(url, {'cinema_hall': other.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(url, {'cinema_hall': show.cinema_hall_id}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        book_seats(show, User.objects.create(username='alice'), ['A1'])
+        response = self.client.patch(url, {'cinema_hall': other.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cinema_hall', response.json())
+        self.client.force_login(User.objects.create(username='manager', is_staff=True))
+        response = self.client.patch(reverse('show-bulk'), [{'show_id': show.pk, 'cinema_hall': other.pk}],
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cinema_hall', response.json()['errors'][0])
+        show.refresh_from_db()
+        self.assertEqual(show.cinema_hall_id, CinemaSeat.objects.get(pk='A1').cinema_hall_id)
+
+
+class SeatMapMigrationTests(TransactionTestCase):
+    before = [('user_api', '0009_movie_current_datetime')]
+    after = [('user_api', '0010_cinemaseat_seat_index_showseatmap')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_booked_shows_become_seat_maps(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Cinema, CinemaHall = apps.get_model('user_api', 'Cinema'), apps.get_model('user_api', 'CinemaHall')
+        Movie, Show = apps.get_model('user_api', 'Movie'), apps.get_model('user_api', 'Show')
+        hall = CinemaHall.objects.create(hall_size='S', cinema=Cinema.objects.create(name='Regal', district='C',
+                                                                                     city='Delhi'))
+        movie = Movie.objects.create(title='Dune', genre='Sci-Fi', release_date=datetime(2024, 3, 1, tzinfo=timezone.utc),
+                                     actors='', director='', duration=166, language='English', about='')
+        show = Show.objects.create(date=datetime(2024, 3, 2, tzinfo=timezone.utc), cinema_hall=hall, movie=movie,
+                                   show_price=Decimal('250.00'))
+        for row_no, col_no in (('A', '10'), ('A', '2'), ('A', '1'), ('AA', '1'), ('B', '1')):
+            apps.get_model('user_api', 'CinemaSeat').objects.create(
+                cinema_seat_id=row_no + col_no, cinema_hall=hall, row_no=row_no, col_no=col_no,
+                booked_shows=str(show.pk) if col_no == '10' else '')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        seats = apps.get_model('user_api', 'CinemaSeat').objects.order_by('seat_index')
+        self.assertEqual([seat.pk for seat in seats], ['A1', 'A2', 'A10', 'B1', 'AA1'])
+        booked = apps.get_model('user_api', 'ShowSeatMap').objects.get(show_id=show.pk).booked
+        self.assertEqual(list(SeatBitmap(booked)), [2])
+
+
+class SalesStatsMigrationTests(TransactionTestCase):
+    before = [('user_api', '0016_log_bucket_indexes')]
+    after = [('user_api', '0017_sales_stats')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_totals_are_built_from_existing_tickets(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Cinema, CinemaHall = apps.get_model('user_api', 'Cinema'), apps.get_model('user_api', 'CinemaHall')
+        Movie, Show = apps.get_model('user_api', 'Movie'), apps.get_model('user_api', 'Show')
+        hall = CinemaHall.objects.create(hall_size='S', cinema=Cinema.objects.create(name='Regal', district='C',
+                                                                                     city='Delhi'))
+        apps.get_model('user_api', 'CinemaSeat').objects.create(cinema_seat_id='A1', cinema_hall=hall, row_no='A',
+                                                                col_no='1', seat_index=0)
+        movie = Movie.objects.create(title='Dune', genre='Sci-Fi', release_date=datetime(2024, 3, 1, tzinfo=timezone.utc),
+                                     actors='', director='', duration=166, language='English', about='')
+        show = Show.objects.create(date=datetime(2024, 3, 2, tzinfo=timezone.utc), cinema_hall=hall, movie=movie,
+                                   show_price=Decimal('250.00'))
+        user = apps.get_model('auth', 'User').objects.create(username='buyer')
+        apps.get_model('user_api', 'Ticket').objects.create(show=show, user=user, price=Decimal('500.00'),
+                                                             seats='A1,A2')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        stats = apps.get_model('user_api', 'ShowStats').objects.get(show_id=show.pk)
+        self.assertEqual((stats.tickets_sold, stats.seats_sold, stats.revenue, stats.capacity),
+                         (1, 2, Decimal('500.00'), 1))
+        self.assertEqual(apps.get_model('user_api', 'CinemaDailyStats').objects.get().revenue, Decimal('500.00'))
+
+
+class TimingWheelHoldStoreTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.store = holds.TimingWheelHoldStore(slots=60, clock=lambda: self.now)
+        self.expired = []
+        self.store.listeners.append(self.expired.append)
+
+    def test_expiry(self):
+        hold = self.store.hold(1, ['A1', 'A2'], 'alice', ttl=30)
+        with self.assertRaises(SeatConflict):
+            self.store.hold(1, ['A2'], 'bob', ttl=30)
+        self.now += 29
+        self.assertEqual(self.store.holders(1, ['A1', 'A2', 'A3']), {'A1': 'alice', 'A2': 'alice'})
+        self.now += 1
+        self.assertEqual(self.store.holders(1, ['A1', 'A2']), {})
+        self.assertEqual(self.expired, [hold])
+
+    def test_extend_beyond_one_rotation(self):
+        hold = self.store.hold(1, ['A1'], 'alice', ttl=10)
+        self.store.extend(hold.hold_id, 'alice', ttl=150)
+        self.now += 100
+        self.assertEqual(self.store.holders(1, ['A1']), {'A1': 'alice'})
+        self.now += 50
+        self.assertEqual(self.store.holders(1, ['A1']), {})
+
+    def test_release_requires_owner(self):
+        hold = self.store.hold(1, ['A1'], 'alice', ttl=10)
+        with self.assertRaises(holds.HoldNotFound):
+            self.store.release(hold.hold_id, 'bob')
+        self.store.release(hold.hold_id, 'alice')
+        self.store.hold(1, ['A1'], 'bob', ttl=10)
+
+    @override_settings(SEAT_HOLD_MAX_LIFETIME=100)
+    def test_extensions_stop_at_the_deadline(self):
+        hold = self.store.hold(1, ['A1', 'A2'], 'alice', ttl=60)
+        self.store.hold(1, ['A3'], 'alice', ttl=60)
+        self.assertEqual(self.store.held_by(1, 'alice'), {'A1', 'A2', 'A3'})
+        self.now += 50
+        self.assertEqual(self.store.extend(hold.hold_id, 'alice', ttl=60).expires_at, self.now + 50)
+        self.now += 50
+        self.assertEqual(self.store.holders(1, ['A1', 'A3']), {})
+        self.assertEqual(self.store.held_by(1, 'alice'), set())
+
+
+class CacheHoldStoreTests(TestCase):
+    def test_hold_conflict_and_release(self):
+        store = holds.CacheHoldStore()
+        hold = store.hold(7, ['A1', 'A2'], 'alice', ttl=30)
+        with self.assertRaises(SeatConflict):
+            store.hold(7, ['A3', 'A2'], 'bob', ttl=30)
+        self.assertEqual(store.holders(7, ['A1', 'A2', 'A3']), {'A1': 'alice', 'A2': 'alice'})
+        self.assertEqual(store.held_by(7, 'alice'), {'A1', 'A2'})
+        with override_settings(SEAT_HOLD_MAX_LIFETIME=60):
+            later = store.hold(7, ['A2', 'A4'], 'alice', ttl=30)
+            self.assertEqual(store.held_by(7, 'alice'), {'A1', 'A2', 'A4'})
+        extended = store.extend(later.hold_id, 'alice', ttl=600)
+        self.assertEqual(extended.expires_at, later.deadline)
+        store.release(hold.hold_id, 'alice')
+        self.assertEqual(store.holders(7, ['A1', 'A2', 'A3']), {'A2': 'alice'})
+
+
+class BookingAPITests(TestCase):
+    def setUp(self):
+        holds._store = None
+        self.show = create_show()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret-pass-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_book_and_seat_map(self):
+        url = reverse('show-book', args=[self.show.pk])
+        response = self.client.post(url, {'seats': ['A1', 'A2']}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.get().price, 500)
+
+        response = self.client.post(url, {'seats': ['A2', 'A3']}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], ['A2'])
+
+        seat_map = self.client.get(reverse('show-seat-map', args=[self.show.pk])).data
+        self.assertEqual(seat_map['capacity'], 10)
+        self.assertEqual(seat_map['available'], 8)
+
+    def test_unknown_seat(self):
+        response = self.client.post(reverse('show-book', args=[self.show.pk]), {'seats': ['Z9']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_hold_blocks_other_buyers(self):
+        response = self.client.post(reverse('show-hold', args=[self.show.pk]), {'seats': ['A1']}, format='json')
+        self.assertEqual(response.status_code, 201)
+        hold_id = response.data['hold_id']
+        self.assertTrue(self.client.get(reverse('show-seat-map', args=[self.show.pk])).data['seats'][0]['held'])
+
+        other = User.objects.create_user('other', 'other@example.com', 'secret-pass-2')
+        with self.assertRaises(SeatConflict):
+            book_seats(self.show, other, ['A1'])
+
+        response = self.client.post(reverse('show-book', args=[self.show.pk]),
+                                    {'seats': ['A1'], 'hold': hold_id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(SEAT_HOLD_MAX_SEATS=3)
+    def test_holds_are_capped_per_show(self):
+        url = reverse('show-hold', args=[self.show.pk])
+        self.assertEqual(self.client.post(url, {'seats': ['A1', 'A2']}, format='json').status_code, 201)
+        self.assertEqual(self.client.post(url, {'seats': ['A2', 'A3']}, format='json').status_code, 201)
+        response = self.client.post(url, {'seats': ['A4']}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('3 seats', response.data['detail'])
+
+    def test_cancel_releases_seats(self):
+        ticket = book_seats(self.show, self.user, ['B1'])
+        self.client.delete(reverse('ticket-detail', args=[ticket.pk]))
+        book_seats(self.show, self.user, ['B1'])
+
+    def test_tickets_only_change_through_booking(self):
+        ticket = book_seats(self.show, self.user, ['A1'])
+        url = reverse('ticket-detail', args=[ticket.pk])
+        anonymous, mallory = APIClient(), APIClient()
+        mallory.force_authenticate(User.objects.create(username='mallory'))
+        self.assertEqual(anonymous.post(reverse('ticket-list'), {'show': self.show.pk, 'user': self.user.pk,
+                                                                 'price': 1, 'seats': 'A1'}).status_code, 405)
+        self.assertEqual(self.client.patch(url, {'seats': 'B5'}, format='json').status_code, 405)
+        self.assertIn(anonymous.delete(url).status_code, (401, 403))
+        self.assertEqual(mallory.delete(url).status_code, 403)
+        with self.assertRaises(SeatConflict):
+            book_seats(self.show, self.user, ['A1'])
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    buyers = 40
+
+    def test_no_double_booking_under_contention(self):
+        holds._store = None
+        show = create_show(rows=2, cols=10)
+        users = [User.objects.create(username='buyer%d' % i) for i in range(self.buyers)]
+        seat_ids = list(CinemaSeat.objects.values_list('pk', flat=True))
+        outcomes = []
+        start = threading.Barrier(self.buyers)
+
+        def buy(i):
+            wanted = [seat_ids[i % len(seat_ids)], seat_ids[(i + 1) % len(seat_ids)]]
+            start.wait()
+            try:
+                book_seats(show, users[i], wanted)
+                outcomes.append('booked')
+            except SeatConflict:
+                outcomes.append('conflict')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(i,)) for i in range(self.buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.buyers)
+        sold = [seat for ticket in Ticket.objects.all() for seat in ticket.seats.split(',')]
+        self.assertEqual(len(sold), len(set(sold)))
+        self.assertEqual(len(SeatBitmap(ShowSeatMap.objects.get(show=show).booked)), len(sold))
+        self.assertEqual(outcomes.count('booked'), Ticket.objects.count())
+
+
+class KeysetPaginationTests(TestCase):
+    def test_walks_all_pages_newest_first(self):
+        Log.objects.bulk_create(Log(message='m%d' % i, level='INFO') for i in range(25))
+        seen, url = [], reverse('log-list') + '?page_size=10'
+        while url:
+            page = self.client.get(url).data
+            seen.extend(row['message'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(seen, ['m%d' % i for i in reversed(range(25))])
+
+
+class NDJSONExportTests(TestCase):
+    def test_streams_every_row(self):
+        Log.objects.bulk_create(Log(message='m%d' % i, level='INFO') for i in range(120))
+        self.client.force_login(User.objects.create(username='auditor', is_staff=True))
+        response = self.client.get(reverse('log-list') + '?format=ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 120)
+        self.assertEqual(json.loads(lines[0])['message'], 'm0')
+
+    def test_exports_are_for_staff(self):
+        show = create_show()
+        Ticket.objects.create(show=show, user=User.objects.create(username='buyer'), price=1, seats='A1')
+        url = reverse('ticket-list') + '?format=ndjson'
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(User.objects.get(username='buyer'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('ticket-list')).status_code, 200)
+
+
+class ExpandTests(TestCase):
+    def setUp(self):
+        show = create_show()
+        for hour in range(19, 23):
+            Show.objects.create(date=show.date.replace(hour=hour), cinema_hall=show.cinema_hall,
+                                movie=show.movie, show_price=show.show_price)
+
+    def test_show_list_expanded_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('show-list') + '?expand=movie,cinema_hall.cinema')
+        show = response.json()['results'][0]
+        self.assertEqual(show['movie']['title'], 'Dune')
+        self.assertEqual(show['cinema_hall']['cinema']['city'], 'Delhi')
+
+    def test_ticket_expanded_through_show(self):
+        user = User.objects.create(username='buyer')
+        for show in Show.objects.all():
+            Ticket.objects.create(show=show, user=user, price=show.show_price, seats='A1')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('ticket-list') + '?expand=show.movie,show.cinema_hall.cinema')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['show']['movie']['director'], 'Denis Villeneuve')
+
+    def test_unexpanded_and_unknown_paths_return_ids(self):
+        response = self.client.get(reverse('show-list') + '?expand=movie.secret')
+        self.assertIsInstance(response.json()['results'][0]['movie'], int)
+
+
+class ShowSearchTests(TestCase):
+    def setUp(self):
+        self.show = create_show()
+        cinema = Cinema.objects.create(name='PVR', district='Andheri', city='Mumbai')
+        hall = CinemaHall.objects.create(hall_size='L', cinema=cinema)
+        movie = Movie.objects.create(title='Jawan', genre='Action', release_date=self.show.movie.release_date,
+                                     actors='Shah Rukh Khan', director='Atlee', duration=169,
+                                     language='Hindi', about='Heist')
+        Show.objects.create(date=datetime(2024, 3, 5, 18, tzinfo=timezone.utc), cinema_hall=hall,
+                            movie=movie, show_price=Decimal('300.00'))
+
+    def search(self, query):
+        return [show['show_id'] for show in self.client.get(reverse('show-list') + query).json()['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.search('?city=Delhi'), [self.show.pk])
+        self.assertEqual(self.search('?language=English&in_theatre=true'), [self.show.pk])
+        self.assertEqual(self.search('?date_from=2024-03-02&date_to=2024-03-02'), [self.show.pk])
+        self.assertEqual(len(self.search('?date_from=2024-03-01')), 2)
+        self.assertEqual(self.search('?genre=Action&city=Delhi'), [])
+        self.assertEqual(self.search('?actor=Zendaya'), [self.show.pk])
+
+    def test_invalid_date(self):
+        response = self.client.get(reverse('show-list') + '?date_from=tomorrow')
+        self.assertEqual(response.status_code, 400)
+
+
+class FacetTests(TestCase):
+    def test_genre_and_actor_counts(self):
+        movie = create_show().movie
+        Movie.objects.create(title='Challengers', genre='Drama, Sci-Fi', release_date=movie.release_date,
+                             actors='Zendaya, Josh OConnor', director='Luca Guadagnino', duration=131,
+                             language='English', about='Tennis')
+        movie.genre = 'Sci-Fi, Adventure'
+        movie.save()
+
+        genres = self.client.get(reverse('movie-genre-facets')).json()
+        self.assertEqual(genres[0], {'name': 'Sci-Fi', 'count': 2})
+        self.assertEqual(len(genres), 3)
+        actors = self.client.get(reverse('movie-actor-facets') + '?limit=1').json()
+        self.assertEqual(actors, [{'name': 'Zendaya', 'count': 2}])
+
+    def test_limit_is_clamped(self):
+        movie = create_show().movie
+        Movie.objects.create(title='Dune Part Two', genre='Sci-Fi', release_date=movie.release_date, actors='',
+                             director='', duration=166, language='English', about='')
+        self.assertEqual(len(self.client.get(reverse('movie-genre-facets') + '?limit=-1').json()), 1)
+        self.assertEqual(len(self.client.get(reverse('movie-search'), {'q': 'dune', 'limit': -5}).json()), 1)
+        self.assertEqual(self.client.get(reverse('movie-genre-facets') + '?limit=x').status_code, 400)
+
+
+class MovieSearchTests(TestCase):
+    def setUp(self):
+        self.dune = create_show().movie
+        self.challengers = Movie.objects.create(
+            title='Challengers', genre='Drama', release_date=self.dune.release_date,
+            actors='Zendaya, Mike Faist', director='Luca Guadagnino', duration=131,
+            language='English', about='A tennis love triangle')
+
+    def search(self, query):
+        return [movie['title'] for movie in self.client.get(reverse('movie-search'), {'q': query}).data]
+
+    def test_prefix_and_ranking(self):
+        self.assertEqual(self.search('chall'), ['Challengers'])
+        self.assertCountEqual(self.search('zend'), ['Dune', 'Challengers'])
+        self.assertEqual(self.search('zendaya tennis'), ['Challengers'])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_index_follows_save_and_delete(self):
+        self.challengers.title = 'Tennis Drama'
+        self.challengers.save()
+        self.assertEqual(self.search('chall'), [])
+        self.assertEqual(self.search('tennis'), ['Tennis Drama'])
+        self.challengers.delete()
+        self.assertEqual(self.search('tennis'), [])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        self.show = create_show()
+
+    def test_hit_skips_database_and_save_invalidates(self):
+        url = reverse('show-list') + '?expand=movie'
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+        self.show.movie.title = 'Dune: Part Two'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.show.movie.save()
+            # A read before the commit can't cache the old row under the new generation
+            self.assertEqual(self.client.get(url).content, first.content)
+        self.assertTrue(callbacks)
+        self.assertEqual(self.client.get(url).json()['results'][0]['movie']['title'], 'Dune: Part Two')
+
+    def test_misses_are_filled_from_the_primary(self):
+        seen = []
+        original = views.MovieListCreateAPIView.list
+
+        def spy(view, request, *args, **kwargs):
+            seen.append(pinned_to_primary())
+            return original(view, request, *args, **kwargs)
+
+        with mock.patch.object(views.MovieListCreateAPIView, 'list', spy):
+            self.client.get(reverse('movie-list'))
+            self.client.get(reverse('movie-list'))
+        self.assertEqual(seen, [True])
+        self.assertFalse(pinned_to_primary())
+
+    def test_conditional_get(self):
+        url = reverse('movie-detail', args=[self.show.movie_id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'rating': 8.5}, content_type='application/json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.show = create_show()
+        self.url = reverse('show-detail', args=[self.show.pk])
+
+    def test_etag_follows_row_version(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], '"show-%s-1"' % self.show.pk)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        expanded = self.client.get(self.url + '?expand=movie')['ETag']
+        self.assertNotEqual(expanded, response['ETag'])
+
+    def test_etag_covers_every_row_on_the_expand_path(self):
+        url = self.url + '?expand=cinema_hall.cinema'
+        etag = self.client.get(url)['ETag']
+        hall = self.show.cinema_hall
+        hall.hall_size = 'L'
+        with self.captureOnCommitCallbacks(execute=True):
+            hall.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_match_rejects_stale_edits(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'show_price': '300.00'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"show-%s-2"' % self.show.pk)
+
+        response = self.client.patch(self.url, {'show_price': '100.00'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.show.refresh_from_db()
+        self.assertEqual(self.show.show_price, Decimal('300.00'))
+
+    def test_if_none_match_on_uncached_detail(self):
+        ticket = Ticket.objects.create(show=self.show, user=User.objects.create(username='u'), price=1, seats='A1')
+        url = reverse('ticket-detail', args=[ticket.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class LogBufferTests(TestCase):
+    def setUp(self):
+        logbuffer._buffer = logbuffer.LogBuffer(max_size=5, flush_size=3, autostart=False)
+
+    def test_batch_is_written_on_flush(self):
+        records = [{'message': 'm%d' % i, 'level': 'INFO'} for i in range(4)]
+        response = self.client.post(reverse('log-batch'), records, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Log.objects.count(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(logbuffer.get_log_buffer().flush(), 4)
+        self.assertEqual(sorted(Log.objects.values_list('message', flat=True)), ['m0', 'm1', 'm2', 'm3'])
+
+    def test_full_buffer_pushes_back(self):
+        records = [{'message': 'm', 'level': 'INFO'}] * 3
+        self.client.post(reverse('log-batch'), records, content_type='application/json')
+        response = self.client.post(reverse('log-batch'), records, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(logbuffer.get_log_buffer()), 3)
+
+    def test_rejects_invalid_records(self):
+        response = self.client.post(reverse('log-batch'), [{'message': 'm'}], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LogRetentionTests(TestCase):
+    def setUp(self):
+        now = datetime.now(timezone.utc)
+        for days_ago, level in ((0, 'ERROR'), (0, 'INFO'), (40, 'ERROR'), (41, 'INFO')):
+            Log.objects.create(message='%s days ago' % days_ago, level=level, timestamp=now - timedelta(days=days_ago))
+
+    def test_range_filter(self):
+        since = (datetime.now(timezone.utc) - timedelta(days=1)).date().isoformat()
+        response = self.client.get(reverse('log-list'), {'level': 'ERROR', 'since': since})
+        self.assertEqual([row['message'] for row in response.json()['results']], ['0 days ago'])
+
+    def test_prune_archives_and_drops_old_days(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('prune_logs', days=30, archive_dir=directory, stdout=open('/dev/null', 'w'))
+            archived = sorted(Path(directory).iterdir())
+            self.assertEqual(len(archived), 2)
+            with gzip.open(archived[0], 'rt') as archive:
+                self.assertEqual(json.loads(archive.readline())['message'], '41 days ago')
+        self.assertEqual(sorted(Log.objects.values_list('level', flat=True)), ['ERROR', 'INFO'])
+
+
+class BulkEndpointTests(TestCase):
+    def setUp(self):
+        self.show = create_show(rows=1, cols=2)
+        self.hall = self.show.cinema_hall
+        self.client.force_login(User.objects.create(username='manager', is_staff=True))
+
+    def test_writes_require_staff(self):
+        self.client.force_login(User.objects.create(username='viewer'))
+        requests = [('cinema-hall-bulk', ()), ('cinema-seat-bulk', ()), ('show-bulk', ()),
+                    ('cinema-hall-layout', (self.hall.pk,)), ('show-schedule', ())]
+        for name, args in requests:
+            response = self.client.post(reverse(name, args=args), [], content_type='application/json')
+            self.assertEqual(response.status_code, 403, name)
+        self.client.logout()
+        response = self.client.post(reverse('show-bulk'), [], content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Show.objects.count(), 1)
+
+    def test_create_seats_with_per_item_errors(self):
+        url = reverse('cinema-seat-bulk')
+        payload = [{'cinema_seat_id': 'B%d' % col, 'cinema_hall': self.hall.pk, 'row_no': 'B', 'col_no': str(col)}
+                   for col in range(1, 4)]
+        payload[1]['cinema_hall'] = 999
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0], {})
+        self.assertIn('cinema_hall', response.json()['errors'][1])
+        self.assertEqual(CinemaSeat.objects.count(), 2)
+
+        payload[1]['cinema_hall'] = self.hall.pk
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([seat['seat_index'] for seat in response.json()], [2, 3, 4])
+
+    def test_duplicate_keys_are_item_errors(self):
+        payload = [{'cinema_seat_id': seat_id, 'cinema_hall': self.hall.pk, 'row_no': 'C', 'col_no': '1'}
+                   for seat_id in ('C1', 'C2', 'C1')]
+        response = self.client.post(reverse('cinema-seat-bulk'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{}, {}, {'cinema_seat_id': ['Same as item 0.']}])
+        self.assertEqual(CinemaSeat.objects.count(), 2)
+
+    def test_update_and_delete_shows(self):
+        url = reverse('show-bulk')
+        other = Show.objects.create(date=self.show.date + timedelta(hours=4), cinema_hall=self.hall,
+                                    movie=self.show.movie, show_price=Decimal('100.00'))
+        response = self.client.patch(url, [{'show_id': self.show.pk, 'show_price': '199.00'},
+                                           {'show_id': other.pk, 'show_price': '99.00'}],
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['version'], 2)
+        other.refresh_from_db()
+        self.assertEqual((other.show_price, other.version), (Decimal('99.00'), 2))
+
+        response = self.client.delete(url, {'ids': [self.show.pk, other.pk]}, content_type='application/json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Show.objects.exists())
+
+    def test_generate_layout(self):
+        hall = CinemaHall.objects.create(hall_size='L', cinema=self.hall.cinema)
+        url = reverse('cinema-hall-layout', args=[hall.pk])
+        response = self.client.post(url, {'rows': 30, 'cols': 20}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        seats = CinemaSeat.objects.filter(cinema_hall=hall)
+        self.assertEqual(seats.count(), 600)
+        self.assertEqual(seats.get(seat_index=599).row_no, 'AD')
+        self.assertEqual(self.client.post(url, {'rows': 1, 'cols': 1}, content_type='application/json').status_code, 409)
+
+    def test_layout_rejects_colliding_seat_ids(self):
+        hall = CinemaHall.objects.create(hall_size='L', cinema=self.hall.cinema)
+        url = reverse('cinema-hall-layout', args=[hall.pk])
+        for labels in (['A', 'A'], ['A', 'A1']):
+            response = self.client.post(url, {'rows': 2, 'cols': 11, 'row_labels': labels},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, labels)
+            self.assertIn('row_labels', response.json())
+        CinemaSeat.objects.create(cinema_seat_id='%s-B1' % hall.pk, cinema_hall=self.hall, row_no='B', col_no='1')
+        response = self.client.post(url, {'rows': 2, 'cols': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(CinemaSeat.objects.filter(cinema_hall=hall).exists())
+
+
+class SchedulingTests(TestCase):
+    def setUp(self):
+        self.show = create_show(rows=1, cols=2)
+        self.hall = self.show.cinema_hall
+        self.movie = self.show.movie
+        self.client.force_login(User.objects.create(username='manager', is_staff=True))
+
+    def test_timeline_conflicts_respect_buffer(self):
+        timeline = HallTimeline(timedelta(minutes=15))
+        start = datetime(2024, 3, 2, 10, tzinfo=timezone.utc)
+        timeline.add(start, start + timedelta(hours=2), 'a')
+        timeline.add(start + timedelta(hours=5), start + timedelta(hours=7), 'b')
+        self.assertEqual(timeline.conflicts(start + timedelta(minutes=135), start + timedelta(hours=4)), [])
+        self.assertEqual([key for _, _, key in timeline.conflicts(start + timedelta(minutes=120),
+                                                                   start + timedelta(hours=4))], ['a'])
+        self.assertEqual([key for _, _, key in timeline.conflicts(start + timedelta(hours=1),
+                                                                   start + timedelta(hours=6))], ['a', 'b'])
+        self.assertEqual(timeline.free_slot(start, timedelta(hours=3), start + timedelta(hours=12)),
+                         start + timedelta(hours=7, minutes=15))
+
+    def test_create_rejects_overlapping_show(self):
+        payload = {'cinema_hall': self.hall.pk, 'movie': self.movie.pk, 'show_price': '200.00',
+                   'date': (self.show.date + timedelta(hours=2)).isoformat()}
+        response = self.client.post(reverse('show-list'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.show.pk), response.json()['date'][0])
+
+        payload['date'] = (self.show.date + timedelta(minutes=195)).isoformat()
+        response = self.client.post(reverse('show-list'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_reports_overlaps_within_batch(self):
+        start = self.show.date + timedelta(days=1)
+        payload = [{'cinema_hall': self.hall.pk, 'movie': self.movie.pk, 'show_price': '200.00',
+                    'date': (start + timedelta(hours=hours)).isoformat()} for hours in (0, 4, 5)]
+        response = self.client.post(reverse('show-bulk'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(errors[:2], [{}, {}])
+        self.assertIn('item 1', errors[2]['date'][0])
+
+    def test_week_of_shows_checked_in_constant_queries(self):
+        halls = CinemaHall.objects.bulk_create(CinemaHall(hall_size='M', cinema=self.hall.cinema)
+                                               for _ in range(50))
+        start = self.show.date + timedelta(days=1)
+        shows = [Show(cinema_hall=hall, movie=self.movie, date=start + timedelta(hours=4 * slot),
+                      show_price=Decimal('100.00'))
+                 for hall in halls for slot in range(40)]
+        with self.assertNumQueries(3):
+            overlaps = find_overlaps(shows)
+        self.assertFalse(any(overlaps))
+
+    def test_schedule_fills_gaps_around_existing_shows(self):
+        day = self.show.date.astimezone(django_timezone.get_current_timezone()).date()
+        payload = {'movie': self.movie.pk, 'cinema_halls': [self.hall.pk], 'date_from': day.isoformat(),
+                   'date_to': day.isoformat(), 'show_price': '150.00'}
+        response = self.client.post(reverse('show-schedule'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        planned = [Show(cinema_hall=self.hall, movie=self.movie, date=parse_datetime(show['date']))
+                   for show in response.json()]
+        self.assertEqual(len(planned), 4)
+        self.assertFalse(any(find_overlaps(planned)))
+        self.assertEqual(Show.objects.count(), 1)
+
+        response = self.client.post(reverse('show-schedule'), {**payload, 'commit': True},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Show.objects.count(), 5)
+
+
+class SalesStatsTests(TestCase):
+    def setUp(self):
+        self.show = create_show(rows=2, cols=5)
+        self.user = User.objects.create(username='buyer')
+        self.admin = User.objects.create(username='manager', is_staff=True)
+
+    def test_totals_follow_sales_and_cancellations(self):
+        book_seats(self.show, self.user, ['A1', 'A2'])
+        ticket = book_seats(self.show, self.user, ['B1'])
+        stats = ShowStats.objects.get(pk=self.show.pk)
+        self.assertEqual((stats.tickets_sold, stats.seats_sold, stats.seats_remaining, stats.revenue),
+                         (2, 3, 7, Decimal('750.00')))
+        movie_day = MovieDailyStats.objects.get(movie=self.show.movie)
+        cinema_day = CinemaDailyStats.objects.get(cinema=self.show.cinema_hall.cinema)
+        self.assertEqual((movie_day.seats_sold, cinema_day.revenue), (3, Decimal('750.00')))
+
+        cancel_ticket(ticket)
+        stats.refresh_from_db()
+        self.assertEqual((stats.tickets_sold, stats.seats_sold, stats.revenue), (1, 2, Decimal('500.00')))
+        self.assertEqual(CinemaDailyStats.objects.get().revenue, Decimal('500.00'))
+
+    def test_edited_ticket_moves_its_totals(self):
+        ticket = book_seats(self.show, self.user, ['A1', 'A2'])
+        ticket.seats, ticket.price = 'A1', Decimal('250.00')
+        ticket.save()
+        stats = ShowStats.objects.get(pk=self.show.pk)
+        self.assertEqual((stats.tickets_sold, stats.seats_sold, stats.revenue), (1, 1, Decimal('250.00')))
+        self.assertEqual(MovieDailyStats.objects.get().revenue, Decimal('250.00'))
+
+    def test_cascaded_delete_costs_the_same_for_any_number_of_tickets(self):
+        other = Show.objects.create(date=self.show.date + timedelta(days=1), cinema_hall=self.show.cinema_hall,
+                                    movie=self.show.movie, show_price=Decimal('250.00'))
+        book_seats(self.show, self.user, ['A1'])
+        Ticket.objects.bulk_create(Ticket(show=other, user=self.user, price=Decimal('10.00'), seats='B%d' % col)
+                                   for col in range(1, 41))
+        rebuild_sales_stats()
+        self.assertEqual(CinemaDailyStats.objects.get().tickets_sold, 41)
+
+        queries = []
+        for show in (self.show, other):
+            with CaptureQueriesContext(connection) as context:
+                show.delete()
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Ticket.objects.exists())
+        totals = CinemaDailyStats.objects.get()
+        self.assertEqual((totals.tickets_sold, totals.seats_sold, totals.revenue), (0, 0, 0))
+
+    def test_sold_show_keeps_its_movie(self):
+        other = Movie.objects.create(title='Challengers', genre='Drama', release_date=self.show.movie.release_date,
+                                     actors='', director='', duration=131, language='English', about='')
+        ticket = book_seats(self.show, self.user, ['A1'])
+        url = reverse('show-detail', args=[self.show.pk])
+        response = self.client.patch(url, {'movie': other.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('movie', response.json())
+
+        cancel_ticket(ticket)
+        self.assertEqual(MovieDailyStats.objects.get(movie=self.show.movie).revenue, 0)
+        response = self.client.patch(url, {'movie': other.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_matches_incremental_totals(self):
+        book_seats(self.show, self.user, ['A1', 'A2'])
+        book_seats(self.show, self.user, ['A3'])
+        expected = list(MovieDailyStats.objects.values('movie', 'day', 'tickets_sold', 'seats_sold', 'revenue'))
+        ShowStats.objects.update(tickets_sold=0)
+        call_command('rebuild_sales_stats', stdout=StringIO())
+        self.assertEqual(ShowStats.objects.get().tickets_sold, 2)
+        self.assertEqual(ShowStats.objects.get().capacity, 10)
+        self.assertEqual(list(MovieDailyStats.objects.values('movie', 'day', 'tickets_sold', 'seats_sold', 'revenue')),
+                         expected)
+
+    def test_reports_read_aggregates_only(self):
+        book_seats(self.show, self.user, ['A1', 'A2'])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('report-movie-totals')).status_code, 403)
+
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('report-show-detail', args=[self.show.pk]))
+        self.assertEqual(response.data['seats_remaining'], 8)
+        with self.assertNumQueries(1):
+            response = client.get(reverse('report-movie-totals'), {'day_from': '2000-01-01'})
+        self.assertEqual(response.data, [{'tickets_sold': 1, 'seats_sold': 2, 'revenue': '500.00',
+                                          'movie': self.show.movie_id}])
+        response = client.get(reverse('report-cinema-daily'), {'cinema': self.show.cinema_hall.cinema_id})
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('member', 'member@example.com', 'secret-pass-1')
+        response = self.client.post(reverse('auth_login'), {'username': 'member', 'password': 'secret-pass-1'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.tokens = response.json()
+        self.client = APIClient()
+
+    def bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % token)
+
+    def test_access_token_needs_no_queries(self):
+        self.bearer(self.tokens['access'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('hold-detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+        self.bearer(self.tokens['access'] + 'x')
+        self.assertEqual(self.client.get(reverse('hold-detail', args=['missing'])).status_code, 401)
+
+    def test_refresh_rotates_and_rejects_reuse(self):
+        url = reverse('token-refresh')
+        response = self.client.post(url, {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], self.tokens['refresh'])
+        reused = self.client.post(url, {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(reused.status_code, 401)
+        self.assertEqual(self.client.post(url, {'refresh': self.tokens['access']}, format='json').status_code, 401)
+
+    def test_revoke_blocks_access_and_refresh(self):
+        self.bearer(self.tokens['access'])
+        response = self.client.post(reverse('token-revoke'), {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(reverse('hold-detail', args=['missing'])).status_code, 401)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+    def test_inactive_and_deleted_users_are_refused(self):
+        url = reverse('hold-detail', args=['missing'])
+        self.bearer(self.tokens['access'])
+        cache.delete('token-user:%s' % User.objects.get().pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        user = User.objects.get()
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+        user.is_active = True
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        user.delete()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_login_starts_a_session_only_when_asked(self):
+        self.assertFalse(Session.objects.exists())
+        response = self.client.post(reverse('auth_login'), {'username': 'member', 'password': 'secret-pass-1',
+                                                            'session': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class CredentialThroughputTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('member', 'member@example.com', 'secret-pass-1')
+
+    def login(self, password='secret-pass-1', username='member'):
+        return self.client.post(reverse('auth_login'), {'username': username, 'password': password},
+                                content_type='application/json')
+
+    def test_pool_refuses_work_beyond_capacity(self):
+        pool = HasherPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+            return 'done'
+
+        worker = threading.Thread(target=pool.run, args=(slow,))
+        worker.start()
+        started.wait()
+        with self.assertRaises(HasherBusy):
+            pool.run(str)
+        self.assertEqual(pool.stats()['running'], 1)
+        release.set()
+        worker.join()
+        self.assertEqual(pool.run(str, 1), '1')
+        self.assertEqual((pool.stats()['completed'], pool.stats()['rejected']), (2, 1))
+
+    def test_login_and_register_use_the_pool(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(username='nobody').status_code, 400)
+        response = self.client.post(reverse('auth_register'), {
+            'username': 'newcomer', 'email': 'new@example.com',
+            'password': 'Another-pass-9', 'password2': 'Another-pass-9'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(username='newcomer').check_password('Another-pass-9'))
+        self.assertGreaterEqual(get_hasher_pool().stats()['completed'], 3)
+
+    def test_username_bucket_throttles_guessing(self):
+        rates = {**LoginUsernameThrottle.THROTTLE_RATES, 'login_username': '2/min'}
+        with mock.patch.object(LoginUsernameThrottle, 'THROTTLE_RATES', rates):
+            self.assertEqual(self.login('wrong-1').status_code, 400)
+            self.assertEqual(self.login('wrong-2').status_code, 400)
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response['Retry-After']), 1)
+            self.assertEqual(self.login(username='nobody').status_code, 400)
+
+    def test_window_slides_with_shared_counters(self):
+        request = APIRequestFactory().post('/', {'username': 'member'}, format='json')
+        request = Request(request, parsers=[JSONParser()])
+        now = [6000.0]
+        rates = {**LoginUsernameThrottle.THROTTLE_RATES, 'login_username': '2/min'}
+        with mock.patch.object(LoginUsernameThrottle, 'THROTTLE_RATES', rates):
+            def allowed(at):
+                now[0] = 6000.0 + at
+                # A fresh instance per request, like separate workers on one cache
+                throttle = LoginUsernameThrottle()
+                throttle.timer = lambda: now[0]
+                return throttle.allow_request(request, None)
+
+            self.assertEqual([allowed(0), allowed(1), allowed(2)], [True, True, False])
+            self.assertFalse(allowed(61))
+            self.assertTrue(allowed(90))
+            self.assertFalse(allowed(91))
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class HasherProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('member', 'member@example.com', 'secret-pass-1')
+
+    def login(self):
+        return self.client.post(reverse('auth_login'), {'username': 'member', 'password': 'secret-pass-1'},
+                                content_type='application/json')
+
+    def test_login_upgrades_cost(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_login_moves_to_preferred_profile(self):
+        hashers = ['user_api.hashers.ScryptPasswordHasher', 'user_api.hashers.PBKDF2PasswordHasher']
+        with self.settings(PASSWORD_HASHERS=hashers, PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10):
+            self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('scrypt$'))
+            self.assertEqual(self.login().status_code, 200)
+            self.assertTrue(self.user.check_password('secret-pass-1'))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_hashers', '--profile', 'pbkdf2', '--rounds', '2', '--threads', '2',
+                     '--budget', '50', stdout=out)
+        self.assertIn('PASSWORD_PBKDF2_ITERATIONS=1000', out.getvalue())
+        self.assertIn('fits a p99 of 50 ms', out.getvalue())
+
+
+class RegistrationUniquenessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('member', 'member@example.com', 'secret-pass-1')
+
+    def register(self, username, email):
+        return self.client.post(reverse('auth_register'), {
+            'username': username, 'email': email,
+            'password': 'Another-pass-9', 'password2': 'Another-pass-9'}, content_type='application/json')
+
+    def test_single_probe_reports_both_fields(self):
+        with self.assertNumQueries(1):
+            taken = find_taken('MEMBER', 'Member@Example.com')
+        self.assertEqual(set(taken), {'username', 'email'})
+        self.assertEqual(find_taken('newcomer', ''), {})
+
+        response = self.register('Member', 'MEMBER@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'username', 'email'})
+        self.assertEqual(self.register('newcomer', 'member@EXAMPLE.com').json(), {'email': [EMAIL_TAKEN]})
+
+    def test_database_settles_races(self):
+        with mock.patch('user_api.serializers.find_taken', side_effect=[{}, {'username': [USERNAME_TAKEN]}]):
+            response = self.register('MEMBER', 'other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'username': [USERNAME_TAKEN]})
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['member'])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create(username='Member', email='other@example.com')
+
+        # Only non-blank emails are unique
+        User.objects.create(username='blank-1', email='')
+        User.objects.create(username='blank-2', email='')
+        self.assertEqual(User.objects.filter(email='').count(), 2)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.show = create_show(rows=1, cols=4)
+        self.user = User.objects.create(username='buyer')
+        self.access = issue_pair(self.user)['access']
+
+    async def test_catalog_pages_and_seat_map(self):
+        client = AsyncClient()
+        response = await client.get(reverse('async-show-list'), {'movie': self.show.movie_id, 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([show['show_id'] for show in response.json()['results']], [self.show.pk])
+        self.assertIsNone(response.json()['next'])
+        response = await client.get(reverse('async-movie-detail', args=[self.show.movie_id]))
+        self.assertEqual(response.json()['title'], 'Dune')
+        self.assertEqual((await client.get(reverse('async-movie-list'), {'limit': 'x'})).status_code, 400)
+
+        response = await client.get(reverse('async-show-seat-map', args=[self.show.pk]))
+        self.assertEqual(response.json()['available'], 4)
+
+    async def test_booking(self):
+        client = AsyncClient()
+        url = reverse('async-show-book', args=[self.show.pk])
+        body = json.dumps({'seats': ['A1', 'A2']})
+        self.assertEqual((await client.post(url, body, content_type='application/json')).status_code, 401)
+        response = await client.post(url, body, content_type='application/json',
+                                     headers={'Authorization': 'Bearer %s' % self.access})
+        self.assertEqual(response.status_code, 201)
+        response = await client.post(url, body, content_type='application/json',
+                                     headers={'Authorization': 'Bearer %s' % self.access})
+        self.assertEqual(response.status_code, 409)
+        response = await client.get(reverse('async-show-seat-map', args=[self.show.pk]))
+        self.assertEqual(response.json()['available'], 2)
+
+
+class SeatEventTests(TestCase):
+    def setUp(self):
+        self.clock = [1000.0]
+        holds._store = holds.TimingWheelHoldStore(clock=lambda: self.clock[0])
+        events._hub = None
+        self.show = create_show(rows=1, cols=4)
+        self.user = User.objects.create(username='buyer')
+
+    def tearDown(self):
+        holds._store = None
+        events._hub = None
+
+    def book(self, seats):
+        with self.captureOnCommitCallbacks(execute=True):
+            return book_seats(self.show, self.user, seats)
+
+    async def test_stream_sends_snapshot_then_changes(self):
+        response = await async_views.show_events(AsyncRequestFactory().get('/'), pk=self.show.pk)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        snapshot = await anext(stream)
+        self.assertIn(b'event: snapshot', snapshot)
+        self.assertIn(b'"available":4', snapshot)
+
+        await sync_to_async(self.book)(['A1', 'A2'])
+        change = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'event: seats', change)
+        self.assertIn(b'"booked":["A1","A2"]', change)
+
+    async def test_holds_fan_out_and_expire(self):
+        hub = events.get_seat_event_hub()
+        subscriptions = [hub.subscribe(self.show.pk) for _ in range(3)]
+        await sync_to_async(holds.hold_seats)(self.show, 'other', ['A3'], ttl=60)
+        for subscription in subscriptions:
+            self.assertIn(b'"held":["A3"]', await subscription.get(1))
+
+        self.clock[0] += 61
+        holds.get_hold_store().expire()
+        self.assertIn(b'"available":["A3"]', await subscriptions[0].get(1))
+
+        stream = async_views.seat_event_stream(hub, subscriptions[1], self.show)
+        await anext(stream)
+        await stream.aclose()
+        self.assertEqual(hub.subscriber_count(self.show.pk), 2)
+
+    async def test_booking_frees_the_unbought_seats_of_its_hold(self):
+        subscription = events.get_seat_event_hub().subscribe(self.show.pk)
+        hold = await sync_to_async(holds.hold_seats)(self.show, str(self.user.pk), ['A1', 'A2'])
+        self.assertIn(b'"held":["A1","A2"]', await subscription.get(1))
+
+        def book():
+            with self.captureOnCommitCallbacks(execute=True):
+                book_seats(self.show, self.user, ['A1'], hold_id=hold.hold_id)
+
+        await sync_to_async(book)()
+        self.assertIn(b'"booked":["A1"]', await subscription.get(1))
+        self.assertIn(b'"available":["A2"]', await subscription.get(1))
+
+    async def test_expired_hold_keeps_seats_booked_around_it(self):
+        subscription = events.get_seat_event_hub().subscribe(self.show.pk)
+        await sync_to_async(holds.hold_seats)(self.show, str(self.user.pk), ['A3', 'A4'], ttl=60)
+        await sync_to_async(self.book)(['A3'])
+        self.assertIn(b'"held"', await subscription.get(1))
+        self.assertIn(b'"booked":["A3"]', await subscription.get(1))
+
+        self.clock[0] += 61
+        holds.get_hold_store().expire()
+        self.assertIn(b'"available":["A4"]', await subscription.get(1))
+
+    async def test_slow_subscriber_gets_resync(self):
+        hub = events.SeatEventHub(max_pending=2)
+        subscription = hub.subscribe(self.show.pk)
+        for seat in ('A1', 'A2', 'A3'):
+            hub.publish(self.show.pk, booked=[seat])
+        await asyncio.sleep(0)
+        self.assertIs(await subscription.get(1), events.RESYNC)
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter(replicas=['replica1', 'replica2'])
+
+    def test_catalog_reads_go_to_a_replica(self):
+        # TestCase wraps every test in a transaction on the primary
+        self.assertEqual(self.router.db_for_read(Movie), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertIn(self.router.db_for_read(Movie), ('replica1', 'replica2'))
+            self.assertIn(self.router.db_for_read(Movie.genres.through), ('replica1', 'replica2'))
+            self.assertEqual(self.router.db_for_read(Ticket), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_write(Movie), 'default')
+
+    def test_pinned_and_transactional_reads_use_the_primary(self):
+        with primary():
+            self.assertEqual(self.router.db_for_read(Movie), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(self.router.db_for_read(Movie), 'default')
+        self.assertFalse(pinned_to_primary())
+
+    def test_booking_resolves_seats_on_the_primary(self):
+        show = create_show(rows=1, cols=2)
+        # An alias that does not exist, any seat read routed there would fail
+        with mock.patch.object(db_router, 'db_for_read', return_value='replica1'):
+            self.assertEqual(resolve_seats(show, ['A2']), {'A2': 1})
+
+    def test_without_replicas_nothing_is_routed(self):
+        router = PrimaryReplicaRouter(replicas=[])
+        self.assertIsNone(router.db_for_read(Movie))
+        self.assertTrue(router.allow_migrate('default', 'user_api'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'user_api'))
+
+    def test_writes_pin_the_client_for_the_replica_lag(self):
+        seen = []
+
+        def view(request):
+            seen.append(pinned_to_primary())
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        middleware = ReadYourWritesMiddleware(view)
+        factory = RequestFactory()
+        self.assertNotIn(PIN_COOKIE, middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, [False, True, True])
+        self.assertFalse(pinned_to_primary())
+
+    def test_async_middleware_pins_on_the_event_loop(self):
+        seen = []
+
+        async def view(request):
+            seen.append(pinned_to_primary())
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(view)
+        response = asyncio.run(middleware(AsyncRequestFactory().put('/')))
+        self.assertEqual(seen, [True])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_use_the_concurrent_profile(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -64 * 1024)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_unknown_transaction_mode_is_rejected(self):
+        wrapper = type(connections['default'])({**connection.settings_dict, 'OPTIONS': {'transaction_mode': 'LAZY'}})
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.get_connection_params()
+
+    def test_concurrent_writers_do_not_hit_lock_errors(self):
+        out = StringIO()
+        call_command('benchmark_sqlite', '--profile', 'concurrent', threads=8, transactions=10, rows=1, stdout=out)
+        self.assertIn(' 80 commits', out.getvalue())
+        self.assertIn(' 0 lock errors', out.getvalue())
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs the API's common queries on a seeded dataset and fails on any full
+    table scan in their EXPLAIN QUERY PLAN. Unfiltered pages are the one
+    exception, they walk the primary key and stop after a page.
+    """
+    # Facets count the movies of every genre and actor, reading them all is the point
+    whole_table = {'genre', 'actor'}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog()
+        cls.staff = User.objects.create(username='auditor', is_staff=True, is_superuser=True)
+        cls.show = Show.objects.order_by('pk')[100]
+        cls.viewer = User.objects.get(username='viewer7')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            plan = [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()]
+        scans = [step for step in plan if step.startswith('SCAN ')
+                 and step.split()[1] not in self.whole_table and 'CONSTANT ROW' not in step]
+        if scans and ' WHERE ' not in sql and ' LIMIT ' in sql:
+            return []
+        return scans
+
+    def assertIndexed(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, url)
+        audited = [query['sql'] for query in queries if query['sql'].startswith(('SELECT', 'UPDATE', 'DELETE'))]
+        self.assertTrue(audited, url)
+        for sql in audited:
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(self.full_scans(sql), [])
+
+    def test_catalog_queries(self):
+        show, movie = self.show, self.show.movie
+        cinema = show.cinema_hall.cinema
+        for url in ['/accounts/shows/', '/accounts/shows/?movie=%d' % movie.pk,
+                    '/accounts/shows/?movie=%d&date_from=2024-02-01' % movie.pk,
+                    '/accounts/shows/?cinema_hall=%d&date_from=2024-02-01' % show.cinema_hall_id,
+                    '/accounts/shows/?cinema=%d' % cinema.pk, '/accounts/shows/?city=%s' % cinema.city,
+                    '/accounts/shows/?date_from=2024-02-01&date_to=2024-02-03',
+                    '/accounts/shows/%d/' % show.pk, '/accounts/shows/%d/seat_map/' % show.pk,
+                    '/accounts/movies/', '/accounts/movies/?language=Language%203',
+                    '/accounts/movies/?in_theatre=true&released_from=2023-12-01',
+                    '/accounts/movies/?released_from=2023-12-01&released_to=2023-12-31',
+                    '/accounts/movies/%d/' % movie.pk, '/accounts/movies/facets/genres/',
+                    '/accounts/cinemas/', '/accounts/cinema_halls/', '/accounts/cinema_seats/']:
+            self.assertIndexed('get', url)
+
+    def test_ticket_queries(self):
+        for url in ['/accounts/tickets/', '/accounts/tickets/?user=%d' % self.viewer.pk,
+                    '/accounts/tickets/?user=%d&purchased_from=2024-06-01' % self.viewer.pk,
+                    '/accounts/tickets/?show=%d' % self.show.pk,
+                    '/accounts/tickets/%d/' % Ticket.objects.filter(user=self.viewer).first().pk]:
+            self.assertIndexed('get', url)
+
+    def test_report_queries(self):
+        show = self.show
+        for url in ['/accounts/reports/shows/?movie=%d' % show.movie_id,
+                    '/accounts/reports/shows/?cinema=%d' % show.cinema_hall.cinema_id,
+                    '/accounts/reports/shows/?date_from=2024-02-01&date_to=2024-02-03',
+                    '/accounts/reports/movies/?movie=%d' % show.movie_id,
+                    '/accounts/reports/movies/?day_from=2024-03-01&day_to=2024-03-07',
+                    '/accounts/reports/movies/totals/?day_from=2024-03-01&day_to=2024-03-07',
+                    '/accounts/reports/cinemas/?cinema=%d' % show.cinema_hall.cinema_id,
+                    '/accounts/reports/cinemas/totals/?day_from=2024-03-01&day_to=2024-03-07']:
+            self.assertIndexed('get', url)
+
+    def test_booking_and_cancel_queries(self):
+        holds._store = None
+        seat = CinemaSeat.objects.filter(cinema_hall_id=self.show.cinema_hall_id).order_by('seat_index').last()
+        self.assertIndexed('post', '/accounts/shows/%d/book/' % self.show.pk, {'seats': [seat.pk]})
+        ticket = Ticket.objects.latest('pk')
+        self.assertIndexed('delete', '/accounts/tickets/%d/' % ticket.pk)
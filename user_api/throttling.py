@@ -0,0 +1,73 @@
+from collections import Counter
+
+from rest_framework.throttling import SimpleRateThrottle
+
+throttled = Counter()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding window counter on the configured cache: a rate of ``N/period``
+    allows N requests in any period, estimated from the counts of the current
+    and the previous fixed window. Only atomic ``add``/``incr``, so the limit
+    holds across processes sharing the cache, with two small entries per client.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        key = '%s:%d' % (self.key, window)
+        # Kept for the next window too, where it is the previous count
+        self.cache.add(key, 0, self.duration * 2)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Evicted in between
+            self.cache.set(key, 1, self.duration * 2)
+            count = 1
+        previous = self.cache.get('%s:%d' % (self.key, window - 1), 0)
+        weight = 1 - elapsed / self.duration
+        if previous * weight + count <= self.num_requests:
+            return True
+        # Rejected requests don't count against the client
+        self.cache.decr(key)
+        count -= 1
+        if previous and count < self.num_requests:
+            # Until enough of the previous window has slid out
+            self.retry_after = (weight - (self.num_requests - count - 1) / previous) * self.duration
+        else:
+            self.retry_after = self.duration - elapsed
+        throttled[self.scope] += 1
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPThrottle(SlidingWindowThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class LoginUsernameThrottle(SlidingWindowThrottle):
+    """Slows down password guessing against one account from many addresses."""
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username.strip():
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': username.strip().lower()}
@@ -0,0 +1,163 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import RevokedToken
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+class TokenError(Exception):
+    pass
+
+
+def _encode(claims):
+    token = jwt.encode(claims, settings.JWT_SIGNING_KEY, algorithm=settings.JWT_ALGORITHM)
+    # PyJWT < 2 returns bytes
+    return token.decode() if isinstance(token, bytes) else token
+
+
+def _claims(user, token_type, ttl):
+    now = int(time.time())
+    return {
+        'sub': str(user.pk),
+        'type': token_type,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + ttl,
+    }
+
+
+def issue_pair(user):
+    """Signed access and refresh tokens for ``user``."""
+    access = _claims(user, ACCESS, settings.JWT_ACCESS_TTL)
+    # The user is at hand, spare the first request with the token its lookup
+    remember_user(user)
+    refresh = _claims(user, REFRESH, settings.JWT_REFRESH_TTL)
+    return {'access': _encode(access), 'refresh': _encode(refresh), 'expires_in': settings.JWT_ACCESS_TTL}
+
+
+def _revoked_key(jti):
+    return 'token-revoked:%s' % jti
+
+
+def is_revoked(claims, durable=False):
+    """
+    Revocations are looked up in the cache, which is all an access token check
+    pays for. ``durable`` also asks the database, for the rare refresh calls and
+    for caches that forgot the entry (restart, per-process locmem).
+    """
+    if cache.get(_revoked_key(claims['jti'])):
+        return True
+    return durable and RevokedToken.objects.filter(pk=claims['jti']).exists()
+
+
+def revoke(claims):
+    """Returns False if the token was already revoked or has expired."""
+    ttl = claims['exp'] - int(time.time())
+    if ttl <= 0:
+        return False
+    cache.set(_revoked_key(claims['jti']), True, ttl)
+    _, created = RevokedToken.objects.get_or_create(
+        jti=claims['jti'], defaults={'expires_at': datetime.fromtimestamp(claims['exp'], tz=timezone.utc)})
+    RevokedToken.objects.filter(expires_at__lt=datetime.now(tz=timezone.utc)).delete()
+    return created
+
+
+def _verify(token, token_type):
+    try:
+        claims = jwt.decode(token, settings.JWT_SIGNING_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise TokenError('Token has expired.')
+    except jwt.InvalidTokenError:
+        raise TokenError('Invalid token.')
+    if claims.get('type') != token_type or 'jti' not in claims or 'sub' not in claims:
+        raise TokenError('Invalid token.')
+    return claims
+
+
+def decode(token, token_type, durable=False):
+    claims = _verify(token, token_type)
+    if is_revoked(claims, durable):
+        raise TokenError('Token has been revoked.')
+    return claims
+
+
+async def adecode(token, token_type):
+    """decode() for async views, the revocation lookup awaits the cache."""
+    claims = _verify(token, token_type)
+    if await cache.aget(_revoked_key(claims['jti'])):
+        raise TokenError('Token has been revoked.')
+    return claims
+
+
+def _user_key(pk):
+    return 'token-user:%s' % pk
+
+
+def _user_state(user):
+    """What user_from_claims needs of a user, False for users that may not sign in."""
+    if user is None or not user.is_active:
+        return False
+    return user.username, user.is_staff, user.is_superuser
+
+
+def remember_user(user):
+    cache.set(_user_key(user.pk), _user_state(user), settings.JWT_USER_TTL)
+
+
+def forget_user(pk):
+    cache.delete(_user_key(pk))
+
+
+def _user(claims, state):
+    if not state:
+        raise TokenError('User is inactive or deleted.')
+    username, is_staff, is_superuser = state
+    return User(pk=int(claims['sub']), username=username, is_active=True, is_staff=is_staff,
+                is_superuser=is_superuser)
+
+
+def user_from_claims(claims):
+    """
+    An unsaved User for the token's subject. The row is checked to exist and be
+    active, through the cache, so that costs one query per user and
+    JWT_USER_TTL. Raises TokenError for deleted and inactive users.
+    """
+    key = _user_key(claims['sub'])
+    state = cache.get(key)
+    if state is None:
+        state = _user_state(User.objects.filter(pk=claims['sub']).first())
+        cache.set(key, state, settings.JWT_USER_TTL)
+    return _user(claims, state)
+
+
+async def auser_from_claims(claims):
+    """user_from_claims() for async views."""
+    key = _user_key(claims['sub'])
+    state = await cache.aget(key)
+    if state is None:
+        state = _user_state(await User.objects.filter(pk=claims['sub']).afirst())
+        await cache.aset(key, state, settings.JWT_USER_TTL)
+    return _user(claims, state)
+
+
+def rotate(refresh_token):
+    """
+    Swap a refresh token for a new pair. The old refresh token is revoked, so
+    presenting it again fails.
+    """
+    claims = decode(refresh_token, REFRESH, durable=True)
+    user = User.objects.filter(pk=claims['sub'], is_active=True).first()
+    if user is None:
+        raise TokenError('User is inactive or deleted.')
+    if not revoke(claims):
+        # Lost a race against another refresh with the same token
+        raise TokenError('Token has been revoked.')
+    return issue_pair(user)
@@ -1,11 +1,14 @@
 from django.urls import path
-from user_api import views
+from user_api import async_views, views
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
     path('register/', views.RegisterView.as_view(), name='auth_register'),
     path('login/', views.LoginView.as_view(), name='auth_login'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/revoke/', views.TokenRevokeView.as_view(), name='token-revoke'),
+    path('metrics/auth/', views.AuthMetricsAPIView.as_view(), name='auth-metrics'),
     path('password_change/', auth_views.PasswordChangeView.as_view(template_name='password_change.html'), name='password_change'),
     path('password_change/done/', auth_views.PasswordChangeDoneView.as_view(template_name='password_change_done.html'), name='password_change_done'),
     path('reset_password/', auth_views.PasswordResetView.as_view(), name='reset_password'),
@@ -15,15 +18,40 @@ urlpatterns = [
     path('cinemas/', views.CinemaListCreateAPIView.as_view(), name='cinema-list'),
     path('cinemas/<int:pk>/', views.CinemaRetrieveUpdateDestroyAPIView.as_view(), name='cinema-detail'),
     path('cinema_halls/', views.CinemaHallListCreateAPIView.as_view(), name='cinema-hall-list'),
+    path('cinema_halls/bulk/', views.CinemaHallBulkAPIView.as_view(), name='cinema-hall-bulk'),
+    path('cinema_halls/<int:pk>/layout/', views.CinemaHallLayoutAPIView.as_view(), name='cinema-hall-layout'),
     path('cinema_halls/<int:pk>/', views.CinemaHallRetrieveUpdateDestroyAPIView.as_view(), name='cinema-hall-detail'),
     path('cinema_seats/', views.CinemaSeatListCreateAPIView.as_view(), name='cinema-seat-list'),
+    path('cinema_seats/bulk/', views.CinemaSeatBulkAPIView.as_view(), name='cinema-seat-bulk'),
     path('cinema_seats/<str:pk>/', views.CinemaSeatRetrieveUpdateDestroyAPIView.as_view(), name='cinema-seat-detail'),
     path('movies/', views.MovieListCreateAPIView.as_view(), name='movie-list'),
     path('movies/<int:pk>/', views.MovieRetrieveUpdateDestroyAPIView.as_view(), name='movie-detail'),
+    path('movies/search/', views.MovieSearchAPIView.as_view(), name='movie-search'),
+    path('movies/facets/genres/', views.GenreFacetAPIView.as_view(), name='movie-genre-facets'),
+    path('movies/facets/actors/', views.ActorFacetAPIView.as_view(), name='movie-actor-facets'),
     path('shows/', views.ShowListCreateAPIView.as_view(), name='show-list'),
+    path('shows/bulk/', views.ShowBulkAPIView.as_view(), name='show-bulk'),
+    path('shows/schedule/', views.ShowScheduleAPIView.as_view(), name='show-schedule'),
     path('shows/<int:pk>/', views.ShowRetrieveUpdateDestroyAPIView.as_view(), name='show-detail'),
-    path('tickets/', views.TicketListCreateAPIView.as_view(), name='ticket-list'),
-    path('tickets/<int:pk>/', views.TicketRetrieveUpdateDestroyAPIView.as_view(), name='ticket-detail'),
+    path('shows/<int:pk>/seat_map/', views.ShowSeatMapAPIView.as_view(), name='show-seat-map'),
+    path('shows/<int:pk>/book/', views.ShowBookingAPIView.as_view(), name='show-book'),
+    path('shows/<int:pk>/holds/', views.SeatHoldCreateAPIView.as_view(), name='show-hold'),
+    path('holds/<str:hold_id>/', views.SeatHoldAPIView.as_view(), name='hold-detail'),
+    path('tickets/', views.TicketListAPIView.as_view(), name='ticket-list'),
+    path('tickets/<int:pk>/', views.TicketRetrieveDestroyAPIView.as_view(), name='ticket-detail'),
     path('logs/', views.LogListCreateAPIView.as_view(), name='log-list'),
+    path('logs/batch/', views.LogBatchCreateAPIView.as_view(), name='log-batch'),
     path('logs/<int:pk>/', views.LogRetrieveUpdateDestroyAPIView.as_view(), name='log-detail'),
+    path('async/movies/', async_views.movie_list, name='async-movie-list'),
+    path('async/movies/<int:pk>/', async_views.movie_detail, name='async-movie-detail'),
+    path('async/shows/', async_views.show_list, name='async-show-list'),
+    path('async/shows/<int:pk>/seat_map/', async_views.show_seat_map, name='async-show-seat-map'),
+    path('async/shows/<int:pk>/events/', async_views.show_events, name='async-show-events'),
+    path('async/shows/<int:pk>/book/', async_views.show_booking, name='async-show-book'),
+    path('reports/shows/', views.ShowStatsListAPIView.as_view(), name='report-show-list'),
+    path('reports/shows/<int:pk>/', views.ShowStatsRetrieveAPIView.as_view(), name='report-show-detail'),
+    path('reports/movies/', views.MovieDailyStatsListAPIView.as_view(), name='report-movie-daily'),
+    path('reports/movies/totals/', views.MovieSalesTotalsAPIView.as_view(), name='report-movie-totals'),
+    path('reports/cinemas/', views.CinemaDailyStatsListAPIView.as_view(), name='report-cinema-daily'),
+    path('reports/cinemas/totals/', views.CinemaSalesTotalsAPIView.as_view(), name='report-cinema-totals'),
 ]
@@ -1,18 +1,50 @@
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.functions import Lower
 UserModel = get_user_model()
 
+USERNAME_TAKEN = 'A user with that username already exists.'
+EMAIL_TAKEN = 'A user with that email already exists.'
+
+
+def find_taken(username, email):
+    """
+    Per-field errors for a username or email that is already registered,
+    compared case-insensitively. One query, answered from the LOWER() unique
+    indexes on auth_user.
+    """
+    username, email = (username or '').strip().lower(), (email or '').strip().lower()
+    match = Q(username_lower=username)
+    if email:
+        # email > '' repeats the partial index condition so SQLite can use it
+        match |= Q(email_lower=email, email__gt='')
+    rows = (UserModel.objects.annotate(username_lower=Lower('username'), email_lower=Lower('email'))
+            .filter(match).values_list('username_lower', 'email_lower')[:2])
+    errors = {}
+    for row_username, row_email in rows:
+        if row_username == username:
+            errors['username'] = [USERNAME_TAKEN]
+        if email and row_email == email:
+            errors['email'] = [EMAIL_TAKEN]
+    return errors
+
+
 def custom_validation(data):
     email = data['email'].strip()
     username = data['username'].strip()
     password = data['password'].strip()
 
-    if not email or UserModel.objects.filter(email=email).exists():
-        raise ValidationError('Email already exists!')
+    if not email:
+        raise ValidationError('An email is required!')
+
+    if not username:
+        raise ValidationError('An username is required!')
+
+    taken = find_taken(username, email)
+    if taken:
+        raise ValidationError(taken)
 
-    if not username or UserModel.objects.filter(username=username).exists():
-        raise ValidationError('Username already exixts!')
-    
     if not password or len(password) < 8:
         raise ValidationError('Password must be 8 characters')
     
@@ -1,98 +1,423 @@
 from django.contrib.auth import login, logout
+from django.contrib.auth.signals import user_logged_in
 from django.contrib.auth.models import User
 from rest_framework import generics, status, permissions
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .serializers import RegisterSerializer, UserLoginSerializer
+from .serializers import RegisterSerializer, UserLoginSerializer, TokenRefreshSerializer, TokenRevokeSerializer
 from rest_framework.authentication import TokenAuthentication
 from .validations import validate_username, validate_password
-from .models import Cinema, CinemaHall, CinemaSeat, Movie, Show, Ticket, Log
+from .models import (Cinema, CinemaHall, CinemaSeat, Movie, Show, Ticket, Log, Genre, Actor, ShowStats,
+                     MovieDailyStats, CinemaDailyStats)
 from .serializers import (CinemaSerializer, CinemaHallSerializer, CinemaSeatSerializer,
-                          MovieSerializer, ShowSerializer, TicketSerializer, LogSerializer)
-from django.shortcuts import redirect
+                          MovieSerializer, ShowSerializer, TicketSerializer, LogSerializer,
+                          BookingSerializer, SeatHoldSerializer, FacetSerializer, HallLayoutSerializer,
+                          ScheduleSerializer, ShowStatsSerializer, MovieDailyStatsSerializer,
+                          CinemaDailyStatsSerializer, MovieSalesTotalsSerializer, CinemaSalesTotalsSerializer)
+from .booking import book_seats, cancel_ticket, BookingContention
+from .seatmap import build_seat_map, SeatConflict, UnknownSeats
+from .holds import get_hold_store, hold_seats, HoldLimitExceeded, HoldNotFound
+from .events import publish_seats
+from .mixins import BulkMixin, CachedResponseMixin, ConditionalMixin, ExpandMixin, NDJSONExportMixin
+from .permissions import IsOwnerOrAdmin
+from .filters import (LogRangeFilter, MovieSearchFilter, ShowSearchFilter, ShowStatsFilter, TicketFilter,
+                      MovieDailyStatsFilter, CinemaDailyStatsFilter, parse_limit)
+from .search import search_movies
+from .logbuffer import get_log_buffer, BufferFull
+from .scheduling import find_overlaps, generate_schedule
+from .cache import bump_generation
+from .authentication import JWTAuthentication
+from .tokens import REFRESH, TokenError, decode, issue_pair, revoke, rotate
+from .passwords import HasherBusy, get_hasher_pool
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle, throttled
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.shortcuts import redirect, get_object_or_404
 from django.conf import settings
 
 
-class CinemaListCreateAPIView(generics.ListCreateAPIView):
+class CinemaListCreateAPIView(CachedResponseMixin, NDJSONExportMixin, generics.ListCreateAPIView):
+    cache_dependencies = (Cinema,)
     queryset = Cinema.objects.all()
     serializer_class = CinemaSerializer
 
 
-class CinemaRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CinemaRetrieveUpdateDestroyAPIView(CachedResponseMixin, ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
+    cache_dependencies = (Cinema,)
     queryset = Cinema.objects.all()
     serializer_class = CinemaSerializer
 
 
-class CinemaHallListCreateAPIView(generics.ListCreateAPIView):
+class CinemaHallListCreateAPIView(CachedResponseMixin, NDJSONExportMixin, generics.ListCreateAPIView):
+    cache_dependencies = (CinemaHall,)
     queryset = CinemaHall.objects.all()
     serializer_class = CinemaHallSerializer
 
 
-class CinemaHallRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CinemaHallRetrieveUpdateDestroyAPIView(CachedResponseMixin, ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
+    cache_dependencies = (CinemaHall,)
     queryset = CinemaHall.objects.all()
     serializer_class = CinemaHallSerializer
 
 
-class CinemaSeatListCreateAPIView(generics.ListCreateAPIView):
+class CinemaHallBulkAPIView(BulkMixin, generics.GenericAPIView):
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = CinemaHall.objects.all()
+    serializer_class = CinemaHallSerializer
+
+
+def row_label(row):
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    label = ''
+    row += 1
+    while row:
+        row, remainder = divmod(row - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
+
+
+class CinemaHallLayoutAPIView(APIView):
+    """Create the full rows x cols seat grid of an empty hall in one INSERT."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def post(self, request, pk):
+        hall = get_object_or_404(CinemaHall, pk=pk)
+        serializer = HallLayoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows, cols = serializer.validated_data['rows'], serializer.validated_data['cols']
+        labels = serializer.validated_data.get('row_labels') or [row_label(row) for row in range(rows)]
+
+        seats = [
+            CinemaSeat(cinema_seat_id='%s-%s%s' % (hall.pk, labels[row], col + 1), cinema_hall=hall,
+                       row_no=labels[row], col_no=str(col + 1))
+            for row in range(rows) for col in range(cols)
+        ]
+        # Labels like 'A1' and 'A' can still spell the same seat id
+        if len({seat.pk for seat in seats}) != len(seats):
+            return Response({"row_labels": "The labels give several seats the same id."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                if CinemaSeat.objects.filter(cinema_hall=hall).exists():
+                    return Response({"detail": "The hall already has seats."}, status=status.HTTP_409_CONFLICT)
+                CinemaSeat.assign_seat_indexes(seats)
+                CinemaSeat.objects.bulk_create(seats)
+        except IntegrityError:
+            return Response({"detail": "Some of the seat ids are taken."}, status=status.HTTP_409_CONFLICT)
+        return Response({"cinema_hall": hall.pk, "seats": len(seats)}, status=status.HTTP_201_CREATED)
+
+
+class CinemaSeatListCreateAPIView(NDJSONExportMixin, generics.ListCreateAPIView):
+    queryset = CinemaSeat.objects.all()
+    serializer_class = CinemaSeatSerializer
+
+
+class CinemaSeatRetrieveUpdateDestroyAPIView(ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CinemaSeat.objects.all()
     serializer_class = CinemaSeatSerializer
 
 
-class CinemaSeatRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CinemaSeatBulkAPIView(BulkMixin, generics.GenericAPIView):
+    permission_classes = (permissions.IsAdminUser,)
     queryset = CinemaSeat.objects.all()
     serializer_class = CinemaSeatSerializer
 
+    def prepare_bulk_create(self, instances):
+        CinemaSeat.assign_seat_indexes(instances)
+
 
-class MovieListCreateAPIView(generics.ListCreateAPIView):
+class MovieListCreateAPIView(CachedResponseMixin, NDJSONExportMixin, generics.ListCreateAPIView):
+    cache_dependencies = (Movie,)
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
+    filter_backends = (MovieSearchFilter,)
 
 
-class MovieRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class MovieRetrieveUpdateDestroyAPIView(CachedResponseMixin, ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
+    cache_dependencies = (Movie,)
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
 
 
-class ShowListCreateAPIView(generics.ListCreateAPIView):
+class MovieSearchAPIView(APIView):
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        limit = parse_limit(request.query_params, self.default_limit, self.max_limit)
+        movies = search_movies(request.query_params.get('q', ''), limit)
+        return Response(MovieSerializer(movies, many=True).data)
+
+
+class FacetAPIView(APIView):
+    """Number of movies per genre or actor, counted on the link table's index."""
+    model = None
+    default_limit = 50
+    max_limit = 500
+
+    def get(self, request):
+        limit = parse_limit(request.query_params, self.default_limit, self.max_limit)
+        facets = (self.model.objects.annotate(count=Count('movies'))
+                  .filter(count__gt=0)
+                  .order_by('-count', 'name')
+                  .values('name', 'count')[:limit])
+        return Response(FacetSerializer(facets, many=True).data)
+
+
+class ShowStatsListAPIView(generics.ListAPIView):
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = ShowStats.objects.all()
+    serializer_class = ShowStatsSerializer
+    filter_backends = (ShowStatsFilter,)
+
+
+class ShowStatsRetrieveAPIView(generics.RetrieveAPIView):
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = ShowStats.objects.all()
+    serializer_class = ShowStatsSerializer
+
+
+class MovieDailyStatsListAPIView(generics.ListAPIView):
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = MovieDailyStats.objects.all()
+    serializer_class = MovieDailyStatsSerializer
+    filter_backends = (MovieDailyStatsFilter,)
+
+
+class CinemaDailyStatsListAPIView(generics.ListAPIView):
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = CinemaDailyStats.objects.all()
+    serializer_class = CinemaDailyStatsSerializer
+    filter_backends = (CinemaDailyStatsFilter,)
+
+
+class SalesTotalsAPIView(generics.GenericAPIView):
+    """Top sellers over a range of days, summed from the daily totals."""
+    permission_classes = (permissions.IsAdminUser,)
+    group_by = None
+    default_limit = 50
+    max_limit = 500
+
+    def get(self, request):
+        limit = parse_limit(request.query_params, self.default_limit, self.max_limit)
+        totals = (self.filter_queryset(self.get_queryset())
+                  .values(self.group_by)
+                  .annotate(tickets_sold=Sum('tickets_sold'), seats_sold=Sum('seats_sold'), revenue=Sum('revenue'))
+                  .order_by('-revenue', self.group_by)[:limit])
+        return Response(self.get_serializer(totals, many=True).data)
+
+
+class MovieSalesTotalsAPIView(SalesTotalsAPIView):
+    queryset = MovieDailyStats.objects.all()
+    serializer_class = MovieSalesTotalsSerializer
+    filter_backends = (MovieDailyStatsFilter,)
+    group_by = 'movie'
+
+
+class CinemaSalesTotalsAPIView(SalesTotalsAPIView):
+    queryset = CinemaDailyStats.objects.all()
+    serializer_class = CinemaSalesTotalsSerializer
+    filter_backends = (CinemaDailyStatsFilter,)
+    group_by = 'cinema'
+
+
+class GenreFacetAPIView(FacetAPIView):
+    model = Genre
+
+
+class ActorFacetAPIView(FacetAPIView):
+    model = Actor
+
+
+class ShowListCreateAPIView(CachedResponseMixin, ExpandMixin, NDJSONExportMixin, generics.ListCreateAPIView):
+    cache_dependencies = (Show, Movie, CinemaHall, Cinema)
+    queryset = Show.objects.all()
+    serializer_class = ShowSerializer
+    filter_backends = (ShowSearchFilter,)
+
+
+class ShowRetrieveUpdateDestroyAPIView(CachedResponseMixin, ExpandMixin, ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
+    cache_dependencies = (Show, Movie, CinemaHall, Cinema)
     queryset = Show.objects.all()
     serializer_class = ShowSerializer
 
 
-class ShowRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ShowBulkAPIView(BulkMixin, generics.GenericAPIView):
+    permission_classes = (permissions.IsAdminUser,)
     queryset = Show.objects.all()
     serializer_class = ShowSerializer
 
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'check_overlaps': False}
+
+    def validate_bulk(self, instances):
+        overlaps = find_overlaps(instances)
+        if any(overlaps):
+            return [{"date": ["Overlaps show %s in this cinema hall." % ', '.join(map(str, keys))]} if keys else {}
+                    for keys in overlaps]
 
-class TicketListCreateAPIView(generics.ListCreateAPIView):
+
+class ShowScheduleAPIView(APIView):
+    """
+    Plan back-to-back shows of a movie in the given halls between opening and
+    closing time of each day, around the shows already scheduled there. The plan
+    is returned as is unless ``commit`` is true, then it is saved.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def post(self, request):
+        serializer = ScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        halls = data['cinema_halls']
+        with transaction.atomic():
+            if data['commit']:
+                # Serialise schedulers of the same halls so their plans cannot overlap
+                list(CinemaHall.objects.select_for_update().filter(pk__in=[hall.pk for hall in halls]))
+            shows = generate_schedule(data['movie'], halls, data['date_from'], data['date_to'],
+                                      data['opens'], data['closes'], data['show_price'], data.get('buffer'))
+            if data['commit'] and shows:
+                Show.objects.bulk_create(shows)
+                transaction.on_commit(lambda: bump_generation(Show))
+        return Response(ShowSerializer(shows, many=True).data,
+                        status=status.HTTP_201_CREATED if data['commit'] else status.HTTP_200_OK)
+
+
+class ShowSeatMapAPIView(APIView):
+    def get(self, request, pk):
+        show = get_object_or_404(Show.objects.select_related('seat_map'), pk=pk)
+        return Response(build_seat_map(show))
+
+
+class ShowBookingAPIView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        show = get_object_or_404(Show, pk=pk)
+        serializer = BookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ticket = book_seats(show, request.user, serializer.validated_data['seats'],
+                                serializer.validated_data.get('hold'))
+        except UnknownSeats as exc:
+            return Response({"unknown_seats": exc.seats}, status=status.HTTP_400_BAD_REQUEST)
+        except SeatConflict as exc:
+            return Response({"conflicts": exc.seats}, status=status.HTTP_409_CONFLICT)
+        except BookingContention as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={"Retry-After": "1"})
+        return Response(TicketSerializer(ticket).data, status=status.HTTP_201_CREATED)
+
+
+class SeatHoldCreateAPIView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        show = get_object_or_404(Show, pk=pk)
+        serializer = SeatHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            hold = hold_seats(show, str(request.user.pk), serializer.validated_data['seats'],
+                              serializer.validated_data.get('ttl'))
+        except UnknownSeats as exc:
+            return Response({"unknown_seats": exc.seats}, status=status.HTTP_400_BAD_REQUEST)
+        except SeatConflict as exc:
+            return Response({"conflicts": exc.seats}, status=status.HTTP_409_CONFLICT)
+        except HoldLimitExceeded as exc:
+            return Response({"detail": "At most %d seats on hold per show." % exc.args[0]},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(SeatHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+
+class SeatHoldAPIView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, hold_id):
+        try:
+            hold = get_hold_store().get(hold_id, str(request.user.pk))
+        except HoldNotFound:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(SeatHoldSerializer(hold).data)
+
+    def patch(self, request, hold_id):
+        serializer = SeatHoldSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        ttl = serializer.validated_data.get('ttl', settings.SEAT_HOLD_TTL)
+        try:
+            hold = get_hold_store().extend(hold_id, str(request.user.pk), ttl)
+        except HoldNotFound:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(SeatHoldSerializer(hold).data)
+
+    def delete(self, request, hold_id):
+        try:
+            hold = get_hold_store().release(hold_id, str(request.user.pk))
+        except HoldNotFound:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        publish_seats(hold.show_id, available=hold.seats)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TicketListAPIView(ExpandMixin, NDJSONExportMixin, generics.ListAPIView):
+    """Tickets are only created by booking seats, see ShowBookingAPIView."""
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    filter_backends = (TicketFilter,)
 
 
-class TicketRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class TicketRetrieveDestroyAPIView(ExpandMixin, ConditionalMixin, generics.RetrieveDestroyAPIView):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    permission_classes = (IsOwnerOrAdmin,)
 
+    def perform_destroy(self, instance):
+        cancel_ticket(instance)
 
-class LogListCreateAPIView(generics.ListCreateAPIView):
+
+class LogListCreateAPIView(NDJSONExportMixin, generics.ListCreateAPIView):
     queryset = Log.objects.all()
     serializer_class = LogSerializer
+    filter_backends = (LogRangeFilter,)
+
 
+class LogBatchCreateAPIView(APIView):
+    """Queue an array of log records, they are written in bulk in the background."""
+
+    def post(self, request):
+        serializer = LogSerializer(data=request.data, many=True, allow_empty=False, max_length=1000)
+        serializer.is_valid(raise_exception=True)
+        try:
+            accepted = get_log_buffer().submit(serializer.validated_data)
+        except BufferFull as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={"Retry-After": "1"})
+        return Response({"accepted": accepted}, status=status.HTTP_202_ACCEPTED)
 
-class LogRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+
+class LogRetrieveUpdateDestroyAPIView(ConditionalMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Log.objects.all()
     serializer_class = LogSerializer
 
 # Create your views here.
 class RegisterView(generics.CreateAPIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (RegisterIPThrottle,)
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
 
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except HasherBusy as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={"Retry-After": "1"})
+
 
 class LoginView(generics.CreateAPIView):
     permission_classes = (permissions.AllowAny,)
     authentication_classes = (TokenAuthentication,)
+    throttle_classes = (LoginIPThrottle, LoginUsernameThrottle)
     serializer_class = UserLoginSerializer
 
     def post(self, request):
@@ -101,9 +426,58 @@ class LoginView(generics.CreateAPIView):
         assert validate_password(data)
         serializer = UserLoginSerializer(data=data)
         if serializer.is_valid(raise_exception=True):
-            user = serializer.check_user(data)
-            login(request, user)
-            return Response({"success": "Successfully Logged In"}, status=status.HTTP_200_OK)
+            try:
+                user = serializer.check_user(data)
+            except HasherBusy as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={"Retry-After": "1"})
+            if serializer.validated_data['session']:
+                login(request, user)
+            else:
+                user_logged_in.send(sender=user.__class__, request=request, user=user)
+            return Response({"success": "Successfully Logged In", **issue_pair(user)}, status=status.HTTP_200_OK)
+
+
+class TokenRefreshView(APIView):
+    permission_classes = (permissions.AllowAny,)
+    authentication_classes = ()
+
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            tokens = rotate(serializer.validated_data['refresh'])
+        except TokenError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(tokens)
+
+
+class TokenRevokeView(APIView):
+    """Revoke the access token of the request and, if given, its refresh token."""
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (JWTAuthentication,)
+
+    def post(self, request):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if 'refresh' in serializer.validated_data:
+            try:
+                claims = decode(serializer.validated_data['refresh'], REFRESH)
+            except TokenError as exc:
+                return Response({"refresh": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            if claims['sub'] != str(request.user.pk):
+                return Response({"refresh": "Token belongs to another user."}, status=status.HTTP_400_BAD_REQUEST)
+            revoke(claims)
+        revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AuthMetricsAPIView(APIView):
+    """Hasher pool queue depth and throttled requests per scope since start."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response({"hasher_pool": get_hasher_pool().stats(), "throttled": dict(throttled)})
 
 
 class LogoutView(APIView):